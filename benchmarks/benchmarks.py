@@ -1,15 +1,27 @@
 from pathlib import Path
 
+import dask
 import lsdb
+import numpy as np
+import pandas as pd
+from corrgi.alignment import autocorrelation_alignment
+from corrgi.correlation.angular_correlation import AngularCorrelation
 from corrgi.correlation.projected_correlation import ProjectedCorrelation
+from corrgi.cosmology import ComovingDistanceTable
+from corrgi.dask import join_count_histograms, perform_auto_counts
 from corrgi.estimators.davis_peebles_estimator import DavisPeeblesEstimator
 from corrgi.estimators.natural_estimator import NaturalEstimator
 from gundam import gundam
+from hipscat.catalog import Catalog
+from hipscat.catalog.catalog_info import CatalogInfo
+from hipscat.pixel_math import HealpixPixel
 
 DATA_DIR_NAME = Path(__file__).parent.parent / "tests" / "data" / "hipscat"
 GALS_WEIGHT_DIR = str(DATA_DIR_NAME / "pcf_gals_weight")
 GALS1_WEIGHT_DIR = str(DATA_DIR_NAME / "pcf_gals1_weight")
 RANS_WEIGHT_DIR = str(DATA_DIR_NAME / "pcf_rans_weight")
+ACF_GALS_WEIGHT_DIR = str(DATA_DIR_NAME / "acf_gals_weight")
+ACF_RANS_WEIGHT_DIR = str(DATA_DIR_NAME / "acf_rans_weight")
 
 
 class ProjectedSuite:
@@ -51,3 +63,153 @@ class ProjectedSuite:
         pcf_params, gals_catalog, gals1_catalog, rans_catalog = cache
         estimator = DavisPeeblesEstimator(ProjectedCorrelation(params=pcf_params, use_weights=True))
         estimator.compute_crosscorrelation_counts(gals_catalog, gals1_catalog, rans_catalog)
+
+
+class AngularSuite:
+    """Benchmarks for angular correlation"""
+
+    timeout = 600  # in seconds
+
+    def setup_cache(self):
+        """Initialize suite"""
+        return (
+            self.create_params(),
+            lsdb.read_hipscat(ACF_GALS_WEIGHT_DIR),
+            lsdb.read_hipscat(ACF_RANS_WEIGHT_DIR),
+        )
+
+    @staticmethod
+    def create_params():
+        """Create the angular params"""
+        params = gundam.packpars(kind="acf")
+        params.nsept = 33  # Number of bins of angular separation
+        params.septmin = 0.01  # Minimum separation in deg
+        params.dsept = 0.1  # Bin size of separation (in log space)
+        return params
+
+    def time_acf_natural_estimator(self, cache):
+        """Times the Natural estimator for an angular auto-correlation"""
+        acf_params, gals_catalog, rans_catalog = cache
+        estimator = NaturalEstimator(AngularCorrelation(params=acf_params, use_weights=True))
+        estimator.compute_autocorrelation_counts(gals_catalog, rans_catalog)
+
+    def peakmem_acf_natural_estimator(self, cache):
+        """Measures the peak memory of the Natural estimator for an angular auto-correlation"""
+        self.time_acf_natural_estimator(cache)
+
+    def time_accf_davis_peebles_estimator(self, cache):
+        """Times the Davis-Peebles estimator for an angular cross-correlation, where
+        the galaxies are correlated with themselves as the second sample"""
+        acf_params, gals_catalog, rans_catalog = cache
+        estimator = DavisPeeblesEstimator(AngularCorrelation(params=acf_params, use_weights=True))
+        estimator.compute_crosscorrelation_counts(gals_catalog, gals_catalog, rans_catalog)
+
+    def peakmem_accf_davis_peebles_estimator(self, cache):
+        """Measures the peak memory of the Davis-Peebles estimator for an angular cross-correlation"""
+        self.time_accf_davis_peebles_estimator(cache)
+
+
+class AngularScalingSuite:
+    """Scaling of the angular pair counts with the size of the catalog, the order of
+    its partitions (and hence their number), the number of bins and the use of weights"""
+
+    timeout = 600  # in seconds
+    params = ([2_000, 8_000, 32_000], [2, 3, 4], [16, 64], [False, True])
+    param_names = ["num_points", "order", "num_bins", "use_weights"]
+
+    def setup(self, num_points, order, num_bins, use_weights):
+        """Create the synthetic catalog and the correlation"""
+        self.catalog = make_synthetic_catalog(num_points, order)
+        params = AngularSuite.create_params()
+        params.nsept = num_bins
+        params.dsept = 3.3 / num_bins  # Keep the same range of separations
+        self.correlation = AngularCorrelation(params=params, use_weights=use_weights)
+
+    def time_auto_counts(self, *_):
+        """Times the pair counts of the catalog"""
+        perform_auto_counts(self.catalog, self.correlation).compute()
+
+    def peakmem_auto_counts(self, *_):
+        """Measures the peak memory of the pair counts of the catalog"""
+        perform_auto_counts(self.catalog, self.correlation).compute()
+
+
+def make_synthetic_catalog(num_points: int, order: int, seed: int = 42) -> lsdb.Catalog:
+    """Creates an in-memory catalog of points uniformly distributed in a patch of the sky
+    of 20x20 degrees, with random weights, partitioned at a single HEALPix order"""
+    rng = np.random.default_rng(seed)
+    sin_dec = rng.uniform(np.sin(np.radians(-10)), np.sin(np.radians(10)), num_points)
+    df = pd.DataFrame(
+        {
+            "ra": rng.uniform(0, 20, num_points),
+            "dec": np.degrees(np.arcsin(sin_dec)),
+            "wei": rng.uniform(0.5, 1.5, num_points),
+        }
+    )
+    return lsdb.from_dataframe(df, lowest_order=order, highest_order=order, catalog_name="synthetic")
+
+
+class AlignmentSuite:
+    """Benchmarks for the alignment of the partitions of a full-sky catalog"""
+
+    params = ([2, 3], [None, 5.0])
+    param_names = ["order", "max_separation"]
+
+    def setup(self, order, _):
+        """Create the catalog structure, without any data"""
+        catalog_info = CatalogInfo(catalog_name="synthetic", catalog_type="object")
+        pixels = [HealpixPixel(order, pixel) for pixel in range(12 * 4**order)]
+        self.catalog = Catalog(catalog_info, pixels)
+
+    def time_autocorrelation_alignment(self, _, max_separation):
+        """Times the alignment of the pairs of partitions"""
+        autocorrelation_alignment(self.catalog, max_separation)
+
+
+class StagesSuite:
+    """Benchmarks for each stage of the counting pipeline, on synthetic data"""
+
+    num_points = 1_000_000
+    num_partials = 10_000
+    pair_size = 5_000
+
+    def setup(self):
+        """Create the synthetic data"""
+        rng = np.random.default_rng(42)
+        sin_dec = rng.uniform(-1, 1, self.num_points)
+        self.df = pd.DataFrame(
+            {
+                "ra": rng.uniform(0, 360, self.num_points),
+                "dec": np.degrees(np.arcsin(sin_dec)),
+                "z": rng.uniform(0.01, 0.5, self.num_points),
+            }
+        )
+        self.catalog_info = CatalogInfo(catalog_name="synthetic", catalog_type="object")
+        self.partials = [dask.delayed(rng.uniform(0, 1e6, 33)) for _ in range(self.num_partials)]
+        self.correlation = AngularCorrelation(params=AngularSuite.create_params())
+        # The pairs of two neighbouring patches of the sky, of fixed size
+        left, right = self.df.iloc[: self.pair_size].copy(), self.df.iloc[: self.pair_size].copy()
+        left["ra"], right["ra"] = left["ra"] / 36, right["ra"] / 36 + 10
+        left["dec"], right["dec"] = left["dec"] / 9, right["dec"] / 9
+        self.left_points = self.correlation.prepare_partition(left, self.catalog_info)
+        self.right_points = self.correlation.prepare_partition(right, self.catalog_info)
+
+    def time_prepare_partition(self):
+        """Times the projection of the coordinates of a partition"""
+        self.correlation.prepare_partition(self.df, self.catalog_info)
+
+    def time_calculate_comoving_distances(self):
+        """Times the interpolation of the comoving distances of a partition"""
+        correlation = ProjectedCorrelation(params=ProjectedSuite.create_params())
+        correlation.distance_table = ComovingDistanceTable(
+            correlation.cosmo, 0.01, 0.5, correlation.distance_tolerance
+        )
+        correlation.calculate_comoving_distances(self.df)
+
+    def time_join_count_histograms(self):
+        """Times the reduction of many partial histograms"""
+        join_count_histograms(self.partials).compute()
+
+    def time_count_cross_pairs(self):
+        """Times the pairing routine on two prepared partitions of fixed size"""
+        self.correlation.count_prepared_cross_pairs(self.left_points, self.right_points)
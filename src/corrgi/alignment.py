@@ -1,5 +1,9 @@
+from __future__ import annotations
+
 import itertools
 
+import healpy as hp
+import numpy as np
 import pandas as pd
 from hipscat.catalog import Catalog
 from hipscat.pixel_tree.pixel_alignment import PixelAlignment
@@ -15,7 +19,7 @@ column_names = [
 ]
 
 
-def autocorrelation_alignment(catalog: Catalog) -> PixelAlignment:
+def autocorrelation_alignment(catalog: Catalog, max_separation: float | None = None) -> PixelAlignment:
     """Determine all pairs of partitions that should be correlated within the same catalog.
 
     This considers all combinations, without duplicates between the "primary" and "join"
@@ -23,6 +27,9 @@ def autocorrelation_alignment(catalog: Catalog) -> PixelAlignment:
 
     Args:
         catalog (Catalog): catalog for auto-correlation.
+        max_separation (float | None): the maximum angular separation, in degrees, at which
+            pairs of objects are counted. Pairs of pixels that are farther apart than this
+            are dropped from the alignment. Defaults to None, which keeps all the pairs.
 
     Returns:
         The alignment object where the `aligned` columns simply match the left pixel.
@@ -32,10 +39,14 @@ def autocorrelation_alignment(catalog: Catalog) -> PixelAlignment:
         for (left, right) in itertools.combinations(catalog.get_healpix_pixels(), 2)
     ]
     upper_triangle = pd.DataFrame(upper_triangle, columns=column_names)
+    if max_separation is not None:
+        upper_triangle = drop_distant_pixel_pairs(upper_triangle, max_separation)
     return PixelAlignment(catalog.pixel_tree, upper_triangle, PixelAlignmentType.OUTER)
 
 
-def crosscorrelation_alignment(catalog_left: Catalog, catalog_right: Catalog) -> PixelAlignment:
+def crosscorrelation_alignment(
+    catalog_left: Catalog, catalog_right: Catalog, max_separation: float | None = None
+) -> PixelAlignment:
     """Determine all pairs of partitions that should be correlated between two catalogs.
 
     This considers the full cross-product of pixels.
@@ -43,6 +54,9 @@ def crosscorrelation_alignment(catalog_left: Catalog, catalog_right: Catalog) ->
     Args:
         catalog_left (Catalog): left side of the cross-correlation.
         catalog_right (Catalog): right side of the cross-correlation.
+        max_separation (float | None): the maximum angular separation, in degrees, at which
+            pairs of objects are counted. Pairs of pixels that are farther apart than this
+            are dropped from the alignment. Defaults to None, which keeps all the pairs.
 
     Returns:
         The alignment object where the `aligned` columns simply match the left pixel.
@@ -54,4 +68,55 @@ def crosscorrelation_alignment(catalog_left: Catalog, catalog_right: Catalog) ->
         )
     ]
     result_mapping = pd.DataFrame(full_product, columns=column_names)
+    if max_separation is not None:
+        result_mapping = drop_distant_pixel_pairs(result_mapping, max_separation)
     return PixelAlignment(catalog_left.pixel_tree, result_mapping, PixelAlignmentType.OUTER)
+
+
+def drop_distant_pixel_pairs(mapping: pd.DataFrame, max_separation: float) -> pd.DataFrame:
+    """Remove the pairs of pixels that cannot hold any pair of objects within the maximum separation.
+
+    Args:
+        mapping (pd.DataFrame): the pixel mapping, with the primary and join pixel columns.
+        max_separation (float): the maximum angular separation, in degrees.
+
+    Returns:
+        The mapping with only the pairs of pixels whose minimum distance is within `max_separation`.
+    """
+    min_separation, _ = get_pixel_separation_bounds(
+        mapping[PixelAlignment.PRIMARY_ORDER_COLUMN_NAME].to_numpy(dtype=np.int64),
+        mapping[PixelAlignment.PRIMARY_PIXEL_COLUMN_NAME].to_numpy(dtype=np.int64),
+        mapping[PixelAlignment.JOIN_ORDER_COLUMN_NAME].to_numpy(dtype=np.int64),
+        mapping[PixelAlignment.JOIN_PIXEL_COLUMN_NAME].to_numpy(dtype=np.int64),
+    )
+    return mapping[min_separation <= max_separation].reset_index(drop=True)
+
+
+def get_pixel_separation_bounds(
+    left_orders: np.ndarray, left_pixels: np.ndarray, right_orders: np.ndarray, right_pixels: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Compute lower and upper bounds for the angular distance between the points of pairs of pixels.
+
+    The bounds are conservative: they use the distance between the pixel centers and the maximum
+    radius of the pixels at their orders, so every pair of points within the two pixels is
+    guaranteed to be separated by a distance within them.
+
+    Args:
+        left_orders (np.ndarray): the HEALPix orders of the left pixels.
+        left_pixels (np.ndarray): the HEALPix (nested) indices of the left pixels.
+        right_orders (np.ndarray): the HEALPix orders of the right pixels.
+        right_pixels (np.ndarray): the HEALPix (nested) indices of the right pixels.
+
+    Returns:
+        The minimum and maximum separations, in degrees, for each pair of pixels.
+    """
+    left_nside, right_nside = 2 ** np.asarray(left_orders), 2 ** np.asarray(right_orders)
+    left_vec = np.array(hp.pix2vec(left_nside, np.asarray(left_pixels), nest=True)).reshape(3, -1)
+    right_vec = np.array(hp.pix2vec(right_nside, np.asarray(right_pixels), nest=True)).reshape(3, -1)
+    # The arctangent is better conditioned than the arccosine for small angles
+    cross_norm = np.linalg.norm(np.cross(left_vec, right_vec, axis=0), axis=0)
+    center_distance = np.arctan2(cross_norm, np.sum(left_vec * right_vec, axis=0))
+    radii = hp.max_pixrad(left_nside) + hp.max_pixrad(right_nside)
+    min_separation = np.clip(center_distance - radii, 0, np.pi)
+    max_separation = np.clip(center_distance + radii, 0, np.pi)
+    return np.degrees(min_separation), np.degrees(max_separation)
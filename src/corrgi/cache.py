@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+from hipscat.io import paths
+from hipscat.io.file_io.file_pointer import get_fs
+from lsdb import Catalog
+
+from corrgi.correlation.correlation import Correlation
+
+# Extension of the files holding the cached counts
+CACHE_FILE_SUFFIX = ".npz"
+
+
+class CountsCache:
+    """On-disk cache of pair counts, to avoid recomputing the counts of random catalogs.
+
+    The counts are stored with a key that identifies the catalogs (their location,
+    their Dask graph and the state of their metadata file on disk) and everything the
+    correlation counts depend on (type, bins, weights and cosmology). Catalogs that
+    are not read directly from disk, e.g. the result of a search, are never cached.
+    When the cache exceeds its maximum size, the least recently used counts are evicted.
+
+    Args:
+        directory (str | Path): The directory where the counts are stored.
+        max_size (int | None): The maximum size of the cache, in bytes. Defaults to None,
+            for which the cache size is not bounded.
+    """
+
+    def __init__(self, directory: str | Path, max_size: int | None = None):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def describe_counts(self, catalogs: list[Catalog], correlation: Correlation) -> dict | None:
+        """Describes the counts between the catalogs (a single catalog for auto counts).
+
+        Args:
+            catalogs (list[Catalog]): The catalogs whose pairs are counted.
+            correlation (Correlation): The correlation instance.
+
+        Returns:
+            The description of the counts, or None if they cannot be cached.
+        """
+        versions = [get_catalog_version(catalog) for catalog in catalogs]
+        if any(version is None for version in versions):
+            return None
+        return {"catalogs": versions, "correlation": correlation.get_counts_signature()}
+
+    def get(self, description: dict) -> np.ndarray | None:
+        """Gets the cached counts for a description, or None if they are not in cache"""
+        file = self._get_file(description)
+        try:
+            with np.load(file) as data:
+                counts = data["counts"]
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            return None
+        _touch(file)
+        return counts
+
+    def put(self, description: dict, counts: np.ndarray):
+        """Stores the counts for a description, evicting old entries if needed"""
+        file = self._get_file(description)
+        temp_file = file.with_name(f"{file.stem}.{os.getpid()}.tmp{CACHE_FILE_SUFFIX}")
+        np.savez(temp_file, counts=counts, description=np.array(_to_json(description)))
+        os.replace(temp_file, file)
+        _touch(file)
+        self._evict()
+
+    def invalidate(self, catalog: Catalog | str | Path) -> int:
+        """Removes all the cached counts involving a catalog.
+
+        Args:
+            catalog (Catalog | str | Path): The catalog, or the path to its directory.
+
+        Returns:
+            The number of entries removed from the cache.
+        """
+        if isinstance(catalog, Catalog):
+            catalog = catalog.hc_structure.catalog_base_dir
+        catalog_path = _get_absolute_path(catalog)
+        removed = 0
+        for file in self._get_files():
+            try:
+                with np.load(file) as data:
+                    description = json.loads(str(data["description"]))
+            except (OSError, ValueError, KeyError):
+                description = None
+            if description is None or any(
+                version["path"] == catalog_path for version in description["catalogs"]
+            ):
+                file.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def clear(self):
+        """Removes all the cached counts"""
+        for file in self._get_files():
+            file.unlink(missing_ok=True)
+
+    def get_size(self) -> int:
+        """The total size of the cached counts, in bytes"""
+        return sum(file.stat().st_size for file in self._get_files())
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache fits its maximum size"""
+        if self.max_size is None:
+            return
+        files = sorted(self._get_files(), key=lambda file: file.stat().st_mtime_ns)
+        total_size = sum(file.stat().st_size for file in files)
+        for file in files:
+            if total_size <= self.max_size:
+                break
+            total_size -= file.stat().st_size
+            file.unlink(missing_ok=True)
+
+    def _get_file(self, description: dict) -> Path:
+        """The path to the file holding the counts for a description"""
+        key = hashlib.sha256(_to_json(description).encode()).hexdigest()
+        return self.directory / f"{key}{CACHE_FILE_SUFFIX}"
+
+    def _get_files(self) -> list[Path]:
+        """The files of the cached counts, excluding temporary files being written"""
+        return [file for file in self.directory.glob(f"*{CACHE_FILE_SUFFIX}") if ".tmp" not in file.name]
+
+
+def get_catalog_version(catalog: Catalog) -> dict | None:
+    """Identifies the data of a catalog read from disk.
+
+    Args:
+        catalog (Catalog): An LSDB catalog.
+
+    Returns:
+        The location of the catalog, the name of its Dask graph and the size and
+        modification time of its metadata file, or None if it is not read from disk.
+    """
+    hc_structure = catalog.hc_structure
+    if not hc_structure.on_disk or hc_structure.catalog_base_dir is None:
+        return None
+    metadata_file = paths.get_parquet_metadata_pointer(hc_structure.catalog_base_dir)
+    try:
+        file_system, metadata_file = get_fs(metadata_file, hc_structure.storage_options)
+        info = file_system.info(metadata_file)
+    except (FileNotFoundError, OSError):
+        return None
+    modified = next((info[field] for field in ("mtime", "LastModified", "updated") if field in info), None)
+    return {
+        "path": _get_absolute_path(hc_structure.catalog_base_dir),
+        "graph": catalog._ddf._name,
+        "metadata": [info.get("size"), str(modified)],
+    }
+
+
+def _touch(file: Path):
+    """Marks a cache entry as recently used, with the precise time rather than the
+    coarse timestamps of the file system, to keep the order of quick accesses"""
+    now = time.time_ns()
+    os.utime(file, ns=(now, now))
+
+
+def _get_absolute_path(path: str | Path) -> str:
+    """The absolute path of a local catalog, or the URL of a remote one"""
+    path = str(path)
+    return path if "://" in path else os.path.abspath(path)
+
+
+def _to_json(description: dict) -> str:
+    """Serializes a description deterministically"""
+    return json.dumps(description, sort_keys=True, default=str)
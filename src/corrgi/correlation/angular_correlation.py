@@ -2,12 +2,12 @@ from typing import Callable
 
 import gundam.cflibfor as cff
 import numpy as np
-import pandas as pd
 from gundam import gundam
-from hipscat.catalog.catalog_info import CatalogInfo
+from lsdb import Catalog
 from munch import Munch
 
 from corrgi.correlation.correlation import Correlation
+from corrgi.grid import GRID_COUNTS_ID, GRID_LOG_FILE, SkipGrid
 
 
 class AngularCorrelation(Correlation):
@@ -24,47 +24,126 @@ class AngularCorrelation(Correlation):
         )
         return bins
 
+    def get_counts_signature(self) -> dict:
+        """The pair counts also depend on the angular separation bins"""
+        return {**super().get_counts_signature(), "sept": np.asarray(self.sept).tolist()}
+
     def _get_auto_method(self):
+        if self.use_grid:
+            return cff.mod.th_A_wg if self.use_weights else cff.mod.th_A
         return cff.mod.th_A_wg_naiveway if self.use_weights else cff.mod.th_A_naiveway
 
     def _get_cross_method(self) -> Callable:
+        if self.use_grid:
+            return cff.mod.th_C_wg if self.use_weights else cff.mod.th_C
         return cff.mod.th_C_wg_naiveway if self.use_weights else cff.mod.th_C_naiveway
 
-    def _construct_auto_args(self, df: pd.DataFrame, catalog_info: CatalogInfo) -> list:
-        args = [
-            len(df),
-            *self.get_coords(df, catalog_info),  # cartesian coordinates
+    def _construct_auto_args(self, points: np.ndarray) -> list:
+        if self.use_grid:
+            return self._construct_auto_grid_args(points)
+        values = self.unpack_partition(points)
+        weights = [values.weight] if self.use_weights else []
+        return [
+            len(values.x),  # number of particles
+            *weights,  # weights of particles
+            values.x,  # cartesian coordinates
+            values.y,
+            values.z,
             self.params.nsept,  # number of angular separation bins
             self.sept,  # bins in angular separation [deg]
         ]
-        if self.use_weights:
-            args = [args[0], df[self.weight_column].to_numpy(), *args[1:]]
-        return args
-
-    def _construct_cross_args(
-        self,
-        left_df: pd.DataFrame,
-        right_df: pd.DataFrame,
-        left_catalog_info: CatalogInfo,
-        right_catalog_info: CatalogInfo,
-    ) -> list:
-        args = [
-            len(left_df),  # number of particles of the left partition
-            *self.get_coords(left_df, left_catalog_info),  # X,Y,Z coordinates of particles
-            len(right_df),  # number of particles of the right partition
-            *self.get_coords(right_df, right_catalog_info),  # X,Y,Z coordinates of particles
+
+    def _construct_cross_args(self, left_points: np.ndarray, right_points: np.ndarray) -> list:
+        if self.use_grid:
+            return self._construct_cross_grid_args(left_points, right_points)
+        left, right = self.unpack_partition(left_points), self.unpack_partition(right_points)
+        left_weights = [left.weight] if self.use_weights else []
+        right_weights = [right.weight] if self.use_weights else []
+        return [
+            len(left.x),  # number of particles of the left partition
+            *left_weights,  # weights of particles
+            left.x,  # X,Y,Z coordinates of particles
+            left.y,
+            left.z,
+            len(right.x),  # number of particles of the right partition
+            *right_weights,  # weights of particles
+            right.x,  # X,Y,Z coordinates of particles
+            right.y,
+            right.z,
             self.params.nsept,  # number of angular separation bins
             self.sept,  # bins in angular separation [deg]
         ]
-        if self.use_weights:
-            args = [
-                args[0],
-                left_df[self.weight_column].to_numpy(),
-                *args[1:5],
-                right_df[self.weight_column].to_numpy(),
-                *args[5:],
-            ]
-        return args
+
+    def _construct_auto_grid_args(self, points: np.ndarray) -> list:
+        """Generate the arguments for the gridded auto pairing method"""
+        values = self.unpack_partition(points)
+        grid = SkipGrid.from_angular_samples([values.ra], [values.dec], dens=self.params.dens)
+        values = self.unpack_partition(points[:, grid.get_sort_index(values.ra, values.dec)])
+        sk, ll = grid.make_tables(values.ra, values.dec)
+        weights = [values.weight] if self.use_weights else []
+        wfib = [0] if self.use_weights else []
+        return [
+            self.num_threads,  # number of threads
+            len(values.x),  # number of particles
+            values.dec,  # DEC of particles [deg]
+            *weights,  # weights of particles
+            values.x,  # cartesian coordinates
+            values.y,
+            values.z,
+            self.params.nsept,  # number of angular separation bins
+            self.sept,  # bins in angular separation [deg]
+            *grid.get_args(),  # grid boundaries and number of cells
+            *wfib,  # no fiber correction
+            GRID_COUNTS_ID,  # counts id for the log
+            GRID_LOG_FILE,  # log file
+            sk,  # skip table
+            ll,  # linked list
+        ]
+
+    def _construct_cross_grid_args(self, left_points: np.ndarray, right_points: np.ndarray) -> list:
+        """Generate the arguments for the gridded cross pairing method. The grid
+        covers both partitions and the skip table is built for the right one."""
+        left, right = self.unpack_partition(left_points), self.unpack_partition(right_points)
+        grid = SkipGrid.from_angular_samples(
+            [left.ra, right.ra], [left.dec, right.dec], dens=self.params.dens
+        )
+        left = self.unpack_partition(left_points[:, grid.get_sort_index(left.ra, left.dec)])
+        right = self.unpack_partition(right_points[:, grid.get_sort_index(right.ra, right.dec)])
+        sk, ll = grid.make_tables(right.ra, right.dec)
+        left_weights = [left.weight] if self.use_weights else []
+        right_weights = [right.weight] if self.use_weights else []
+        wfib = [0] if self.use_weights else []
+        return [
+            self.num_threads,  # number of threads
+            len(left.x),  # number of particles of the left partition
+            left.ra,  # RA of particles [deg]
+            left.dec,  # DEC of particles [deg]
+            *left_weights,  # weights of particles
+            left.x,  # X,Y,Z coordinates of particles
+            left.y,
+            left.z,
+            len(right.x),  # number of particles of the right partition
+            *right_weights,  # weights of particles
+            right.x,  # X,Y,Z coordinates of particles
+            right.y,
+            right.z,
+            self.params.nsept,  # number of angular separation bins
+            self.sept,  # bins in angular separation [deg]
+            *grid.get_args(),  # grid boundaries and number of cells
+            *wfib,  # no fiber correction
+            GRID_COUNTS_ID,  # counts id for the log
+            GRID_LOG_FILE,  # log file
+            sk,  # skip table of the right partition
+            ll,  # linked list of the right partition
+        ]
+
+    def get_max_angular_separation(self, catalogs: list[Catalog]) -> float:
+        """The maximum angular separation is the right edge of the last bin"""
+        return self.sept[-1]
+
+    def make_empty_counts(self) -> np.ndarray:
+        """Returns the counts histogram for a sample without any pairs"""
+        return np.zeros(self.params.nsept)
 
     def get_bdd_counts(self) -> np.ndarray:
         """Returns the boostrap counts for the angular correlation"""
@@ -6,9 +6,11 @@ from typing import Callable
 import numpy as np
 import pandas as pd
 from hipscat.catalog.catalog_info import CatalogInfo
+from hipscat.pixel_math import HealpixPixel
 from lsdb import Catalog
 from munch import Munch
 
+from corrgi.grid import GRID_NUM_THREADS
 from corrgi.utils import project_coordinates
 
 
@@ -25,6 +27,32 @@ class Correlation(ABC):
         self.weight_column = weight_column
         self.use_weights = use_weights
 
+    @property
+    def use_grid(self) -> bool:
+        """Whether pairs are counted with the gridded Fortran routines, enabled with `grid=1`"""
+        return bool(self.params.get("grid", False))
+
+    @property
+    def num_threads(self) -> int:
+        """The number of OpenMP threads used by the gridded Fortran routines for each pair
+        of partitions, set with `nthreads`.
+
+        With more than one thread, a worker process can use several cores on a single
+        expensive pair of partitions, so fewer processes need to hold copies of the same
+        partitions. The routines hold the GIL and their threads are not managed by Dask,
+        so use a single thread per worker and `nthreads` cores for each of them, e.g.
+        `Client(n_workers=2, threads_per_worker=1)` with `nthreads=4` on 8 cores. The
+        naive routines (without `grid=1`) always count in a single thread.
+        """
+        num_threads = int(self.params.get("nthreads", GRID_NUM_THREADS))
+        if num_threads < 1:
+            raise ValueError("The number of threads of the pairing routines must be positive")
+        return num_threads
+
+    def setup(self, catalogs: list[Catalog]):
+        """Prepares any state that depends on the catalogs before their pairs are counted"""
+        return
+
     def validate(self, catalogs: list[Catalog]):
         """Validate that the correlation args/data are valid"""
         if not self.use_weights:
@@ -36,10 +64,60 @@ class Correlation(ABC):
                     + f" in {catalog.hc_structure.catalog_info.catalog_name}"
                 )
 
+    def get_counts_signature(self) -> dict:
+        """Describes everything, other than the catalogs, that the pair counts depend on"""
+        signature = {"correlation": type(self).__name__, "use_weights": self.use_weights}
+        if self.use_weights:
+            signature["weight_column"] = self.weight_column
+        return signature
+
+    def get_required_columns(self, catalog_info: CatalogInfo) -> list[str]:
+        """The columns of a catalog that are needed to count its pairs"""
+        columns = [catalog_info.ra_column, catalog_info.dec_column]
+        if self.use_weights:
+            columns.append(self.weight_column)
+        return list(dict.fromkeys(columns))
+
+    def get_prepared_columns(self) -> list[str]:
+        """Names of the values held in each row of the prepared partitions"""
+        columns = ["ra", "dec", "x", "y", "z"]
+        if self.use_weights:
+            columns.append("weight")
+        return columns
+
+    def prepare_partition(self, df: pd.DataFrame, catalog_info: CatalogInfo) -> np.ndarray:
+        """Maps a partition to the compact array of values needed to count its pairs.
+
+        The array has one row per value named in `get_prepared_columns` and one column
+        per point, so that each partition is only projected once, however many pairs
+        of partitions it takes part in.
+
+        Args:
+            df (pd.DataFrame): The partition dataframe.
+            catalog_info (CatalogInfo): The catalog metadata.
+
+        Returns:
+            The float64 array of values for the points of the partition.
+        """
+        ra, dec = self.get_ra_dec(df, catalog_info)
+        values = [ra, dec, *project_coordinates(ra=ra, dec=dec)]
+        if self.use_weights:
+            values.append(df[self.weight_column].to_numpy())
+        return np.array(values, dtype=np.float64).reshape(len(values), len(df))
+
+    def unpack_partition(self, points: np.ndarray) -> Munch:
+        """Maps the names of the prepared columns to the rows of a prepared partition"""
+        return Munch(zip(self.get_prepared_columns(), points))
+
+    def compute_partition_stats(self, points: np.ndarray) -> np.ndarray:
+        """Computes the number of points of a prepared partition, and the sums of
+        their weights and squared weights (which are one when weights are not used)"""
+        weights = self.unpack_partition(points).weight if self.use_weights else np.ones(points.shape[1])
+        return np.array([points.shape[1], np.sum(weights), np.sum(weights**2)], dtype=np.float64)
+
     def count_auto_pairs(self, df: pd.DataFrame, catalog_info: CatalogInfo) -> np.ndarray:
         """Computes the counts for pairs of the same partition"""
-        args = self._construct_auto_args(df, catalog_info)
-        return self._get_auto_method()(*args)
+        return self.count_prepared_auto_pairs(self.prepare_partition(df, catalog_info))
 
     def count_cross_pairs(
         self,
@@ -49,7 +127,23 @@ class Correlation(ABC):
         right_catalog_info: CatalogInfo,
     ) -> np.ndarray:
         """Computes the counts for pairs of different partitions"""
-        args = self._construct_cross_args(left_df, right_df, left_catalog_info, right_catalog_info)
+        return self.count_prepared_cross_pairs(
+            self.prepare_partition(left_df, left_catalog_info),
+            self.prepare_partition(right_df, right_catalog_info),
+        )
+
+    def count_prepared_auto_pairs(self, points: np.ndarray) -> np.ndarray:
+        """Computes the counts for pairs of the same prepared partition"""
+        if points.shape[1] == 0:
+            return self.make_empty_counts()
+        args = self._construct_auto_args(points)
+        return self._get_auto_method()(*args)
+
+    def count_prepared_cross_pairs(self, left_points: np.ndarray, right_points: np.ndarray) -> np.ndarray:
+        """Computes the counts for pairs of different prepared partitions"""
+        if left_points.shape[1] == 0 or right_points.shape[1] == 0:
+            return self.make_empty_counts()
+        args = self._construct_cross_args(left_points, right_points)
         return self._get_cross_method()(*args)
 
     @abstractmethod
@@ -63,7 +157,7 @@ class Correlation(ABC):
         raise NotImplementedError()
 
     @abstractmethod
-    def _construct_auto_args(self, df: pd.DataFrame, catalog_info: CatalogInfo) -> list:
+    def _construct_auto_args(self, points: np.ndarray) -> list:
         """Generate the arguments required for the auto pairing method"""
         raise NotImplementedError()
 
@@ -73,16 +167,27 @@ class Correlation(ABC):
         raise NotImplementedError()
 
     @abstractmethod
-    def _construct_cross_args(
-        self,
-        left_df: pd.DataFrame,
-        right_df: pd.DataFrame,
-        left_catalog_info: CatalogInfo,
-        right_catalog_info: CatalogInfo,
-    ) -> list:
+    def _construct_cross_args(self, left_points: np.ndarray, right_points: np.ndarray) -> list:
         """Generate the arguments required for the cross pairing method"""
         raise NotImplementedError()
 
+    @abstractmethod
+    def get_max_angular_separation(self, catalogs: list[Catalog]) -> float:
+        """Returns the maximum angular separation, in degrees, of the pairs to count"""
+        raise NotImplementedError()
+
+    def prune_pixel_pairs(
+        self, left: Catalog, right: Catalog, pixel_pairs: list[tuple[HealpixPixel, HealpixPixel]]
+    ) -> list[tuple[HealpixPixel, HealpixPixel]]:
+        """Removes the aligned pairs of partitions that cannot hold any pair of points
+        within the bins, beyond the angular separation used for the alignment"""
+        return pixel_pairs
+
+    @abstractmethod
+    def make_empty_counts(self) -> np.ndarray:
+        """Returns the counts histogram for a sample without any pairs"""
+        raise NotImplementedError()
+
     @abstractmethod
     def get_bdd_counts(self) -> np.ndarray:
         """Returns the boostrap counts for the correlation"""
@@ -92,9 +197,12 @@ class Correlation(ABC):
         """Applies final transformations to the correlation counts"""
         return counts
 
+    def transform_resampled_counts(self, counts: np.ndarray) -> np.ndarray:
+        """Applies final transformations to the resampled counts, whose last
+        dimension holds the samples"""
+        return counts
+
     @staticmethod
-    def get_coords(df: pd.DataFrame, catalog_info: CatalogInfo) -> tuple[float, float, float]:
-        """Calculate the cartesian coordinates for the points in the partition"""
-        return project_coordinates(
-            ra=df[catalog_info.ra_column].to_numpy(), dec=df[catalog_info.dec_column].to_numpy()
-        )
+    def get_ra_dec(df: pd.DataFrame, catalog_info: CatalogInfo) -> tuple[np.ndarray, np.ndarray]:
+        """Get the equatorial coordinates, in degrees, of the points in the partition"""
+        return df[catalog_info.ra_column].to_numpy(), df[catalog_info.dec_column].to_numpy()
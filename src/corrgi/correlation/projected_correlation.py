@@ -1,18 +1,17 @@
+from __future__ import annotations
+
 from typing import Callable
 
 import gundam.cflibfor as cff
 import numpy as np
-import pandas as pd
-from astropy.cosmology import LambdaCDM
 from gundam import gundam
-from hipscat.catalog.catalog_info import CatalogInfo
-from lsdb import Catalog
 from munch import Munch
 
-from corrgi.correlation.correlation import Correlation
+from corrgi.correlation.spatial_correlation import SpatialCorrelation
+from corrgi.grid import GRID_COUNTS_ID, GRID_LOG_FILE, SkipGrid
 
 
-class ProjectedCorrelation(Correlation):
+class ProjectedCorrelation(SpatialCorrelation):
     """The projected correlation utilities."""
 
     def __init__(
@@ -21,18 +20,10 @@ class ProjectedCorrelation(Correlation):
         weight_column: str = "wei",
         redshift_column: str = "z",
         use_weights: bool = False,
+        distance_tolerance: float | None = 1e-7,
     ):
-        super().__init__(params, weight_column, use_weights)
-        self.redshift_column = redshift_column
+        super().__init__(params, weight_column, redshift_column, use_weights, distance_tolerance)
         self.sepp, self.sepv = self.make_bins()
-        self.cosmo = LambdaCDM(H0=params.h0, Om0=params.omegam, Ode0=params.omegal)
-
-    def validate(self, catalogs: list[Catalog]):
-        """Validate that the correlation args/data are valid"""
-        super().validate(catalogs)
-        for catalog in catalogs:
-            if self.redshift_column not in catalog.columns:
-                raise ValueError(f"Redshift column {self.redshift_column} not found in {catalog}")
 
     def make_bins(self) -> tuple[list]:
         """Generate bins of projected separation and LOS for the correlation"""
@@ -42,63 +33,209 @@ class ProjectedCorrelation(Correlation):
         sepv, _ = gundam.makebins(self.params.nsepv, 0.0, self.params.dsepv, False)
         return sepp, sepv
 
-    def calculate_comoving_distances(self, df: pd.DataFrame) -> np.ndarray:
-        """Calculate the comoving distances from the redshift of each particle"""
-        return self.cosmo.comoving_distance(df[self.redshift_column].to_numpy()).value
+    def get_counts_signature(self) -> dict:
+        """The pair counts also depend on the bins of projected and radial separation"""
+        return {
+            **super().get_counts_signature(),
+            "sepp": np.asarray(self.sepp).tolist(),
+            "sepv": np.asarray(self.sepv).tolist(),
+        }
+
+    def count_prepared_auto_pairs(self, points: np.ndarray) -> np.ndarray:
+        """Computes the counts for pairs of the same prepared partition. Without the grid,
+        the points are split in radial slabs and only the pairs of points in the same or
+        in adjacent slabs are compared, as the others are farther apart than the last pi bin."""
+        if self.use_grid:
+            return super().count_prepared_auto_pairs(points)
+        count_auto_pairs = super().count_prepared_auto_pairs
+        count_cross_pairs = super().count_prepared_cross_pairs
+        slabs = self.split_radial_slabs(points)
+        counts = [count_auto_pairs(slab) for slab in slabs.values()]
+        counts += [
+            count_cross_pairs(slab, slabs[index + 1]) for index, slab in slabs.items() if index + 1 in slabs
+        ]
+        return np.sum(counts, axis=0) if len(counts) > 0 else self.make_empty_counts()
+
+    def count_prepared_cross_pairs(self, left_points: np.ndarray, right_points: np.ndarray) -> np.ndarray:
+        """Computes the counts for pairs of different prepared partitions, comparing only
+        the radial slabs of each partition that are adjacent to the other's (when not gridded)"""
+        if self.use_grid:
+            return super().count_prepared_cross_pairs(left_points, right_points)
+        count_cross_pairs = super().count_prepared_cross_pairs
+        left_slabs, right_slabs = self.split_radial_slabs(left_points), self.split_radial_slabs(right_points)
+        counts = [
+            count_cross_pairs(left_slab, right_slabs[index])
+            for left_index, left_slab in left_slabs.items()
+            for index in (left_index - 1, left_index, left_index + 1)
+            if index in right_slabs
+        ]
+        return np.sum(counts, axis=0) if len(counts) > 0 else self.make_empty_counts()
+
+    def split_radial_slabs(self, points: np.ndarray) -> dict[int, np.ndarray]:
+        """Splits a prepared partition in slabs of comoving distance as wide as the maximum
+        radial separation, so that only the points in the same or adjacent slabs can be paired.
+
+        Returns:
+            The points of each non-empty slab, by the index of the slab along the line of sight.
+        """
+        distances = self.unpack_partition(points).dc
+        slab_indices = np.floor(distances / self.get_max_radial_separation()).astype(np.int64)
+        order = np.argsort(slab_indices, kind="stable")
+        indices, starts = np.unique(slab_indices[order], return_index=True)
+        return {
+            int(index): points[:, slab_order]
+            for index, slab_order in zip(indices, np.split(order, starts[1:]))
+        }
 
     def _get_auto_method(self) -> Callable:
+        if self.use_grid:
+            return cff.mod.rppi_A_wg if self.use_weights else cff.mod.rppi_A
         return cff.mod.rppi_A_wg_naiveway if self.use_weights else cff.mod.rppi_A_naiveway
 
-    def _construct_auto_args(self, df: pd.DataFrame, catalog_info: CatalogInfo) -> list:
-        args = [
-            len(df),
-            self.calculate_comoving_distances(df),
-            *self.get_coords(df, catalog_info),  # cartesian coordinates
+    def _construct_auto_args(self, points: np.ndarray) -> list:
+        if self.use_grid:
+            return self._construct_auto_grid_args(points)
+        values = self.unpack_partition(points)
+        weights = [values.weight] if self.use_weights else []
+        return [
+            len(values.x),  # number of particles
+            values.dc,  # comoving distances of particles
+            *weights,  # weights of particles
+            values.x,  # cartesian coordinates
+            values.y,
+            values.z,
             self.params.nsepp,  # number of bins of projected separation rp
             self.sepp,  # Bins in projected separation rp
             self.params.nsepv,  # number of bins of LOS separation pi
             self.sepv,  # Bins in radial separation
         ]
-        if self.use_weights:
-            args = [*args[:2], df[self.weight_column].to_numpy(), *args[2:]]
-        return args
 
     def _get_cross_method(self) -> Callable:
+        if self.use_grid:
+            return cff.mod.rppi_C_wg if self.use_weights else cff.mod.rppi_C
         return cff.mod.rppi_C_wg_naiveway if self.use_weights else cff.mod.rppi_C_naiveway
 
-    def _construct_cross_args(
-        self,
-        left_df: pd.DataFrame,
-        right_df: pd.DataFrame,
-        left_catalog_info: CatalogInfo,
-        right_catalog_info: CatalogInfo,
-    ) -> list:
-        args = [
-            len(left_df),
-            self.calculate_comoving_distances(left_df),
-            *self.get_coords(left_df, left_catalog_info),
-            len(right_df),
-            self.calculate_comoving_distances(right_df),
-            *self.get_coords(right_df, right_catalog_info),
-            self.params.nsepp,
-            self.sepp,
-            self.params.nsepv,
-            self.sepv,
+    def _construct_cross_args(self, left_points: np.ndarray, right_points: np.ndarray) -> list:
+        if self.use_grid:
+            return self._construct_cross_grid_args(left_points, right_points)
+        left, right = self.unpack_partition(left_points), self.unpack_partition(right_points)
+        left_weights = [left.weight] if self.use_weights else []
+        right_weights = [right.weight] if self.use_weights else []
+        return [
+            len(left.x),  # number of particles of the left partition
+            left.dc,  # comoving distances of particles
+            *left_weights,  # weights of particles
+            left.x,  # X,Y,Z coordinates of particles
+            left.y,
+            left.z,
+            len(right.x),  # number of particles of the right partition
+            right.dc,  # comoving distances of particles
+            *right_weights,  # weights of particles
+            right.x,  # X,Y,Z coordinates of particles
+            right.y,
+            right.z,
+            self.params.nsepp,  # number of bins of projected separation rp
+            self.sepp,  # Bins in projected separation rp
+            self.params.nsepv,  # number of bins of LOS separation pi
+            self.sepv,  # Bins in radial separation
         ]
-        if self.use_weights:
-            args = [
-                *args[:2],
-                left_df[self.weight_column].to_numpy(),
-                *args[2:7],
-                right_df[self.weight_column].to_numpy(),
-                *args[7:],
-            ]
-        return args
+
+    def _construct_auto_grid_args(self, points: np.ndarray) -> list:
+        """Generate the arguments for the gridded auto pairing method"""
+        values = self.unpack_partition(points)
+        grid = SkipGrid.from_spatial_samples(
+            [values.ra], [values.dec], [values.dc], self.sepv[-1], dens=self.params.dens
+        )
+        values = self.unpack_partition(points[:, grid.get_sort_index(values.ra, values.dec)])
+        sk, ll = grid.make_tables(values.ra, values.dec, values.dc, self.sepv)
+        weights = [values.weight] if self.use_weights else []
+        wfib = [0] if self.use_weights else []
+        return [
+            self.num_threads,  # number of threads
+            len(values.x),  # number of particles
+            values.dec,  # DEC of particles [deg]
+            values.dc,  # comoving distances of particles
+            *weights,  # weights of particles
+            values.x,  # cartesian coordinates
+            values.y,
+            values.z,
+            self.params.nsepp,  # number of bins of projected separation rp
+            self.sepp,  # Bins in projected separation rp
+            self.params.nsepv,  # number of bins of LOS separation pi
+            self.sepv,  # Bins in radial separation
+            *grid.get_args(),  # grid boundaries and number of cells
+            *wfib,  # no fiber correction
+            GRID_COUNTS_ID,  # counts id for the log
+            GRID_LOG_FILE,  # log file
+            sk,  # skip table
+            ll,  # linked list
+        ]
+
+    def _construct_cross_grid_args(self, left_points: np.ndarray, right_points: np.ndarray) -> list:
+        """Generate the arguments for the gridded cross pairing method. The grid
+        covers both partitions and the skip table is built for the right one."""
+        left, right = self.unpack_partition(left_points), self.unpack_partition(right_points)
+        grid = SkipGrid.from_spatial_samples(
+            [left.ra, right.ra],
+            [left.dec, right.dec],
+            [left.dc, right.dc],
+            self.sepv[-1],
+            dens=self.params.dens,
+        )
+        left = self.unpack_partition(left_points[:, grid.get_sort_index(left.ra, left.dec)])
+        right = self.unpack_partition(right_points[:, grid.get_sort_index(right.ra, right.dec)])
+        sk, ll = grid.make_tables(right.ra, right.dec, right.dc, self.sepv)
+        left_weights = [left.weight] if self.use_weights else []
+        right_weights = [right.weight] if self.use_weights else []
+        wfib = [0] if self.use_weights else []
+        return [
+            self.num_threads,  # number of threads
+            len(left.x),  # number of particles of the left partition
+            left.ra,  # RA of particles [deg]
+            left.dec,  # DEC of particles [deg]
+            left.dc,  # comoving distances of particles
+            *left_weights,  # weights of particles
+            left.x,  # X,Y,Z coordinates of particles
+            left.y,
+            left.z,
+            len(right.x),  # number of particles of the right partition
+            right.dc,  # comoving distances of particles
+            *right_weights,  # weights of particles
+            right.x,  # X,Y,Z coordinates of particles
+            right.y,
+            right.z,
+            self.params.nsepp,  # number of bins of projected separation rp
+            self.sepp,  # Bins in projected separation rp
+            self.params.nsepv,  # number of bins of LOS separation pi
+            self.sepv,  # Bins in radial separation
+            *grid.get_args(),  # grid boundaries and number of cells
+            *wfib,  # no fiber correction
+            GRID_COUNTS_ID,  # counts id for the log
+            GRID_LOG_FILE,  # log file
+            sk,  # skip table of the right partition
+            ll,  # linked list of the right partition
+        ]
+
+    def get_max_transverse_separation(self) -> float:
+        """The maximum projected separation is the right edge of the last rp bin"""
+        return self.sepp[-1]
+
+    def get_max_radial_separation(self) -> float:
+        """The maximum radial separation is the right edge of the last pi bin"""
+        return self.sepv[-1]
+
+    def make_empty_counts(self) -> np.ndarray:
+        """Returns the counts histogram for a sample without any pairs"""
+        return np.zeros([self.params.nsepv, self.params.nsepp])
 
     def transform_counts(self, counts: list[np.ndarray]) -> list[np.ndarray]:
         """The projected counts need to be transposed before being sent to Fortran"""
         return [c.transpose([1, 0]) for c in counts]
 
+    def transform_resampled_counts(self, counts: np.ndarray) -> np.ndarray:
+        """The resampled counts are transposed like the counts, keeping the samples last"""
+        return counts.transpose([1, 0, 2])
+
     def get_bdd_counts(self) -> np.ndarray:
         """Returns the boostrap counts for the projected correlation"""
         return np.zeros([self.params.nsepp, self.params.nsepv, 0])
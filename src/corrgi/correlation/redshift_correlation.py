@@ -1,46 +1,139 @@
+from __future__ import annotations
+
 from typing import Callable
 
+import gundam.cflibfor as cff
 import numpy as np
-import pandas as pd
-from hipscat.catalog.catalog_info import CatalogInfo
-from lsdb import Catalog
+from gundam import gundam
+from munch import Munch
+
+from corrgi.correlation.spatial_correlation import SpatialCorrelation
+from corrgi.grid import GRID_COUNTS_ID, GRID_LOG_FILE, SkipGrid
+
 
-from corrgi.correlation.correlation import Correlation
+class RedshiftCorrelation(SpatialCorrelation):
+    """The redshift-space correlation utilities.
 
+    The pairs are counted in bins of 3D separation (s) with the gridded gundam
+    routines, whether or not `grid` is set, as gundam has no brute-force
+    routines for redshift space.
 
-class RedshiftCorrelation(Correlation):
-    """The redshift correlation utilities."""
+    Only the correlation in bins of s is supported. The s-μ correlation, in bins
+    of s and of the cosine μ of the angle to the line of sight, is not, as gundam
+    has no routines to count the pairs in bins of μ.
+    """
+
+    def __init__(
+        self,
+        params: Munch,
+        weight_column: str = "wei",
+        redshift_column: str = "z",
+        use_weights: bool = False,
+        distance_tolerance: float | None = 1e-7,
+    ):
+        super().__init__(params, weight_column, redshift_column, use_weights, distance_tolerance)
+        self.seps = self.make_bins()
 
-    def validate(self, catalogs: list[Catalog]):
-        """Validate that the correlation args/data are valid"""
-        super().validate(catalogs)
+    def make_bins(self) -> list:
+        """Generate the bins of 3D separation"""
+        bins, _ = gundam.makebins(
+            self.params.nseps, self.params.sepsmin, self.params.dseps, self.params.logseps
+        )
+        return bins
 
-    def make_bins(self):
-        """Generate bins for the correlation"""
-        raise NotImplementedError()
+    def get_counts_signature(self) -> dict:
+        """The pair counts also depend on the bins of 3D separation"""
+        return {**super().get_counts_signature(), "seps": np.asarray(self.seps).tolist()}
 
     def _get_auto_method(self) -> Callable:
-        raise NotImplementedError()
+        return cff.mod.s_A_wg if self.use_weights else cff.mod.s_A
 
-    def _construct_auto_args(self, df: pd.DataFrame, catalog_info: CatalogInfo) -> list:
-        raise NotImplementedError()
+    def _construct_auto_args(self, points: np.ndarray) -> list:
+        values = self.unpack_partition(points)
+        grid = SkipGrid.from_spatial_samples(
+            [values.ra], [values.dec], [values.dc], self.seps[-1], kind="s", dens=self.params.dens
+        )
+        values = self.unpack_partition(points[:, grid.get_sort_index(values.ra, values.dec)])
+        sk, ll = grid.make_tables(values.ra, values.dec, values.dc, self.seps)
+        weights = [values.weight] if self.use_weights else []
+        wfib = [0] if self.use_weights else []
+        return [
+            self.num_threads,  # number of threads
+            len(values.x),  # number of particles
+            values.dec,  # DEC of particles [deg]
+            values.dc,  # comoving distances of particles
+            *weights,  # weights of particles
+            values.x,  # cartesian coordinates
+            values.y,
+            values.z,
+            self.params.nseps,  # number of bins of 3D separation
+            self.seps,  # bins in 3D separation
+            *grid.get_args(),  # grid boundaries and number of cells
+            *wfib,  # no fiber correction
+            GRID_COUNTS_ID,  # counts id for the log
+            GRID_LOG_FILE,  # log file
+            sk,  # skip table
+            ll,  # linked list
+        ]
 
     def _get_cross_method(self) -> Callable:
-        raise NotImplementedError()
+        return cff.mod.s_C_wg if self.use_weights else cff.mod.s_C
 
-    def _construct_cross_args(
-        self,
-        left_df: pd.DataFrame,
-        right_df: pd.DataFrame,
-        left_catalog_info: CatalogInfo,
-        right_catalog_info: CatalogInfo,
-    ) -> list:
-        raise NotImplementedError()
+    def _construct_cross_args(self, left_points: np.ndarray, right_points: np.ndarray) -> list:
+        """The grid covers both partitions and the skip table is built for the right one"""
+        left, right = self.unpack_partition(left_points), self.unpack_partition(right_points)
+        grid = SkipGrid.from_spatial_samples(
+            [left.ra, right.ra],
+            [left.dec, right.dec],
+            [left.dc, right.dc],
+            self.seps[-1],
+            kind="s",
+            dens=self.params.dens,
+        )
+        left = self.unpack_partition(left_points[:, grid.get_sort_index(left.ra, left.dec)])
+        right = self.unpack_partition(right_points[:, grid.get_sort_index(right.ra, right.dec)])
+        sk, ll = grid.make_tables(right.ra, right.dec, right.dc, self.seps)
+        left_weights = [left.weight] if self.use_weights else []
+        right_weights = [right.weight] if self.use_weights else []
+        wfib = [0] if self.use_weights else []
+        return [
+            self.num_threads,  # number of threads
+            len(left.x),  # number of particles of the left partition
+            left.ra,  # RA of particles [deg]
+            left.dec,  # DEC of particles [deg]
+            left.dc,  # comoving distances of particles
+            *left_weights,  # weights of particles
+            left.x,  # X,Y,Z coordinates of particles
+            left.y,
+            left.z,
+            len(right.x),  # number of particles of the right partition
+            right.dc,  # comoving distances of particles
+            *right_weights,  # weights of particles
+            right.x,  # X,Y,Z coordinates of particles
+            right.y,
+            right.z,
+            self.params.nseps,  # number of bins of 3D separation
+            self.seps,  # bins in 3D separation
+            *grid.get_args(),  # grid boundaries and number of cells
+            *wfib,  # no fiber correction
+            GRID_COUNTS_ID,  # counts id for the log
+            GRID_LOG_FILE,  # log file
+            sk,  # skip table of the right partition
+            ll,  # linked list of the right partition
+        ]
 
-    def get_bdd_counts(self) -> np.ndarray:
-        """Returns the boostrap counts for the correlation"""
-        raise NotImplementedError()
+    def get_max_transverse_separation(self) -> float:
+        """The 3D separation bounds the separation perpendicular to the line of sight"""
+        return self.seps[-1]
+
+    def get_max_radial_separation(self) -> float:
+        """The 3D separation bounds the separation along the line of sight"""
+        return self.seps[-1]
 
-    def transform_counts(self, counts: list[np.ndarray]) -> list[np.ndarray]:
-        """Applies final transformations to the correlation counts"""
-        raise NotImplementedError()
+    def make_empty_counts(self) -> np.ndarray:
+        """Returns the counts histogram for a sample without any pairs"""
+        return np.zeros(self.params.nseps)
+
+    def get_bdd_counts(self) -> np.ndarray:
+        """Returns the boostrap counts for the redshift correlation"""
+        return np.zeros([self.params.nseps, 0])
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from abc import abstractmethod
+
+import numpy as np
+import pandas as pd
+from astropy.cosmology import LambdaCDM
+from hipscat.catalog.catalog_info import CatalogInfo
+from hipscat.pixel_math import HealpixPixel
+from lsdb import Catalog
+from munch import Munch
+
+from corrgi.correlation.correlation import Correlation
+from corrgi.cosmology import ComovingDistanceTable
+from corrgi.utils import compute_column_bounds
+
+
+class SpatialCorrelation(Correlation):
+    """Base class for the correlations in 3D space, which place the points at
+    the comoving distances of their redshifts."""
+
+    def __init__(
+        self,
+        params: Munch,
+        weight_column: str = "wei",
+        redshift_column: str = "z",
+        use_weights: bool = False,
+        distance_tolerance: float | None = 1e-7,
+    ):
+        super().__init__(params, weight_column, use_weights)
+        self.redshift_column = redshift_column
+        self.cosmo = LambdaCDM(H0=params.h0, Om0=params.omegam, Ode0=params.omegal)
+        # The comoving distances are interpolated, within this tolerance relative to the largest
+        # distance, from a table built for the redshift range of the catalogs. Set to None to
+        # compute them exactly.
+        self.distance_tolerance = distance_tolerance
+        self.distance_table = None
+        # The redshift bounds of the partitions, by name of the catalog graph
+        self._redshift_bounds: dict[str, dict[HealpixPixel, tuple[float, float]]] = {}
+
+    def validate(self, catalogs: list[Catalog]):
+        """Validate that the correlation args/data are valid"""
+        super().validate(catalogs)
+        for catalog in catalogs:
+            if self.redshift_column not in catalog.columns:
+                raise ValueError(f"Redshift column {self.redshift_column} not found in {catalog}")
+
+    def get_counts_signature(self) -> dict:
+        """The pair counts also depend on the redshift column and the cosmology
+        (and tolerance) used to compute the comoving distances"""
+        return {
+            **super().get_counts_signature(),
+            "redshift_column": self.redshift_column,
+            "cosmology": [self.params.h0, self.params.omegam, self.params.omegal],
+            "distance_tolerance": self.distance_tolerance,
+        }
+
+    def setup(self, catalogs: list[Catalog]):
+        """Builds the comoving distances table for the redshift range of the catalogs"""
+        if self.distance_tolerance is None:
+            return
+        min_redshift, max_redshift = self.get_redshift_range(catalogs)
+        if self.distance_table is not None:
+            if self.distance_table.covers(min_redshift, max_redshift):
+                return
+            min_redshift = min(min_redshift, self.distance_table.min_redshift)
+            max_redshift = max(max_redshift, self.distance_table.max_redshift)
+        self.distance_table = ComovingDistanceTable(
+            self.cosmo, min_redshift, max_redshift, self.distance_tolerance
+        )
+
+    def get_redshift_bounds(self, catalog: Catalog) -> dict[HealpixPixel, tuple[float, float]]:
+        """Finds the smallest and largest redshift of each partition of a catalog"""
+        name = catalog._ddf._name
+        if name not in self._redshift_bounds:
+            self._redshift_bounds[name] = compute_column_bounds(catalog, self.redshift_column)
+        return self._redshift_bounds[name]
+
+    def get_redshift_range(self, catalogs: list[Catalog]) -> tuple[float, float]:
+        """Finds the smallest and largest redshift of the catalogs"""
+        bounds = [self.get_redshift_bounds(catalog).values() for catalog in catalogs]
+        min_redshift = min(np.nanmin([low for low, _ in catalog_bounds]) for catalog_bounds in bounds)
+        max_redshift = max(np.nanmax([high for _, high in catalog_bounds]) for catalog_bounds in bounds)
+        return min_redshift, max_redshift
+
+    def calculate_comoving_distances(self, df: pd.DataFrame) -> np.ndarray:
+        """Calculate the comoving distances from the redshift of each particle"""
+        redshifts = df[self.redshift_column].to_numpy()
+        if self.distance_table is not None:
+            return self.distance_table(redshifts)
+        return self.cosmo.comoving_distance(redshifts).value
+
+    def get_required_columns(self, catalog_info: CatalogInfo) -> list[str]:
+        """The spatial counts also need the redshift column of the catalogs"""
+        return list(dict.fromkeys([*super().get_required_columns(catalog_info), self.redshift_column]))
+
+    def get_prepared_columns(self) -> list[str]:
+        """The spatial counts also need the comoving distances of the points"""
+        return [*super().get_prepared_columns(), "dc"]
+
+    def prepare_partition(self, df: pd.DataFrame, catalog_info: CatalogInfo) -> np.ndarray:
+        """Maps a partition to the compact array of values needed to count its pairs,
+        including the comoving distances of the points"""
+        points = super().prepare_partition(df, catalog_info)
+        return np.vstack([points, self.calculate_comoving_distances(df)])
+
+    def get_max_angular_separation(self, catalogs: list[Catalog]) -> float:
+        """Converts the maximum transverse separation to an angle at the smallest comoving
+        distance of the catalogs. Pairs with larger angles cannot be any closer in projection."""
+        min_redshift, _ = self.get_redshift_range(catalogs)
+        min_distance = self.cosmo.comoving_distance(min_redshift).value
+        max_separation = self.get_max_transverse_separation()
+        # The transverse separation is rp = 2 * sqrt(dc1 * dc2) * sin(theta / 2)
+        if min_distance <= 0 or max_separation >= 2 * min_distance:
+            return 180.0
+        return np.rad2deg(2 * np.arcsin(max_separation / (2 * min_distance)))
+
+    def prune_pixel_pairs(
+        self, left: Catalog, right: Catalog, pixel_pairs: list[tuple[HealpixPixel, HealpixPixel]]
+    ) -> list[tuple[HealpixPixel, HealpixPixel]]:
+        """Removes the pairs of partitions whose ranges of comoving distance are farther
+        apart than the maximum radial separation, according to their redshift bounds"""
+        if len(pixel_pairs) == 0:
+            return pixel_pairs
+        left_bounds, right_bounds = self.get_redshift_bounds(left), self.get_redshift_bounds(right)
+        left_redshifts = np.array([left_bounds[left_pixel] for left_pixel, _ in pixel_pairs], dtype=float)
+        right_redshifts = np.array([right_bounds[right_pixel] for _, right_pixel in pixel_pairs], dtype=float)
+        left_distances = self.cosmo.comoving_distance(left_redshifts).value
+        right_distances = self.cosmo.comoving_distance(right_redshifts).value
+        gaps = np.maximum(
+            left_distances[:, 0] - right_distances[:, 1], right_distances[:, 0] - left_distances[:, 1]
+        )
+        # Allow for the interpolation error of the distances, and keep the pairs with unknown bounds
+        max_error = self.distance_table.max_error if self.distance_table is not None else 0
+        margins = 2 * max_error + 1e-9 * np.maximum(left_distances[:, 1], right_distances[:, 1])
+        keep = ~(gaps > self.get_max_radial_separation() + margins)
+        return [pixel_pair for pixel_pair, keep_pair in zip(pixel_pairs, keep) if keep_pair]
+
+    @abstractmethod
+    def get_max_transverse_separation(self) -> float:
+        """Returns the maximum separation, perpendicular to the line of sight, of the pairs to count"""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_max_radial_separation(self) -> float:
+        """Returns the maximum separation, along the line of sight, of the pairs to count"""
+        raise NotImplementedError()
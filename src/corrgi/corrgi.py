@@ -1,13 +1,24 @@
+from __future__ import annotations
+
+import hipscat
+import lsdb
 import numpy as np
+from hipscat.io.file_io import FilePointer
 from lsdb import Catalog
 
+from corrgi.cache import CountsCache
 from corrgi.correlation.correlation import Correlation
 from corrgi.estimators.estimator_factory import get_estimator_for_correlation
 
 
 def compute_autocorrelation(
-    catalog: Catalog, random: Catalog, corr_type: type[Correlation], **kwargs
-) -> np.ndarray:
+    catalog: Catalog,
+    random: Catalog,
+    corr_type: type[Correlation],
+    cache: CountsCache | None = None,
+    return_covariance: bool = False,
+    **kwargs,
+) -> np.ndarray | tuple[np.ndarray, np.ndarray]:
     """Calculates the auto-correlation for a catalog.
 
     Args:
@@ -15,22 +26,34 @@ def compute_autocorrelation(
         random (Catalog): A random samples catalog (R).
         corr_type (type[Correlation]): The corrgi class corresponding to the type of
             correlation (AngularCorrelation, RedshiftCorrelation, or ProjectedCorrelation).
+        cache (CountsCache | None): The on-disk cache for the counts of the random catalog
+            (RR for auto-correlations, CR for cross-correlations). Defaults to None.
+        return_covariance (bool): Whether to also return the covariance matrix of the result,
+            estimated from the resampling enabled in the correlation kwargs (`doboot`).
         **kwargs (dict): The arguments for the creation of the correlation instance.
 
     Returns:
         A numpy array with the result of the auto-correlation, according to the estimator
         provided in the correlation kwargs. More information on how to set up the input parameters
         in https://gundam.readthedocs.io/en/latest/introduction.html#set-up-input-parameters.
+        With `return_covariance`, the tuple of the result and its covariance matrix.
     """
     correlation = corr_type(**kwargs)
     correlation.validate([catalog, random])
-    estimator = get_estimator_for_correlation(correlation)
-    return estimator.compute_auto_estimate(catalog, random)
+    catalog, random = select_required_columns([catalog, random], correlation)
+    estimator = get_estimator_for_correlation(correlation, cache)
+    return estimator.compute_auto_estimate(catalog, random, return_covariance)
 
 
 def compute_crosscorrelation(
-    left: Catalog, right: Catalog, random: Catalog, corr_type: type[Correlation], **kwargs
-) -> np.ndarray:
+    left: Catalog,
+    right: Catalog,
+    random: Catalog,
+    corr_type: type[Correlation],
+    cache: CountsCache | None = None,
+    return_covariance: bool = False,
+    **kwargs,
+) -> np.ndarray | tuple[np.ndarray, np.ndarray]:
     """Computes the cross-correlation between two catalogs.
 
     Args:
@@ -39,14 +62,55 @@ def compute_crosscorrelation(
         random (Catalog): A random samples catalog (R).
         corr_type (type[Correlation]): The corrgi class corresponding to the type of
             correlation (AngularCorrelation, RedshiftCorrelation, or ProjectedCorrelation).
+        cache (CountsCache | None): The on-disk cache for the counts of the random catalog
+            (RR for auto-correlations, CR for cross-correlations). Defaults to None.
+        return_covariance (bool): Whether to also return the covariance matrix of the result,
+            estimated from the resampling enabled in the correlation kwargs (`doboot`).
         **kwargs (dict): The arguments for the creation of the correlation instance.
 
     Returns:
         A numpy array with the result of the cross-correlation, according to the estimator
         provided in the correlation kwargs. More information on how to set up the input parameters
         in https://gundam.readthedocs.io/en/latest/introduction.html#set-up-input-parameters.
+        With `return_covariance`, the tuple of the result and its covariance matrix.
     """
     correlation = corr_type(**kwargs)
     correlation.validate([left, right, random])
-    estimator = get_estimator_for_correlation(correlation)
-    return estimator.compute_cross_estimate(left, right, random)
+    left, right, random = select_required_columns([left, right, random], correlation)
+    estimator = get_estimator_for_correlation(correlation, cache)
+    return estimator.compute_cross_estimate(left, right, random, return_covariance)
+
+
+def read_catalog(path: FilePointer, correlation: Correlation, **kwargs) -> Catalog:
+    """Loads a catalog with only the columns needed by the correlation, so that the
+    rest of the columns are never read from disk.
+
+    Args:
+        path (FilePointer): The path to the HiPSCat catalog.
+        correlation (Correlation): The correlation instance.
+        **kwargs (dict): The arguments for `lsdb.read_hipscat` (e.g. `search_filter`).
+
+    Returns:
+        The catalog, with the columns required by the correlation.
+    """
+    catalog_info = hipscat.read_from_hipscat(path).catalog_info
+    return lsdb.read_hipscat(path, columns=correlation.get_required_columns(catalog_info), **kwargs)
+
+
+def select_required_columns(catalogs: list[Catalog], correlation: Correlation) -> list[Catalog]:
+    """Restricts the catalogs to the columns needed by the correlation, so that
+    the unused columns are dropped before the partitions are prepared for counting.
+
+    The selection is applied to the partitions after they are loaded, so it does not
+    reduce what is read from disk. Use `read_catalog` to avoid reading the unused columns.
+
+    Args:
+        catalogs (list[Catalog]): The catalogs to be correlated.
+        correlation (Correlation): The correlation instance.
+
+    Returns:
+        The list of catalogs with only the required columns.
+    """
+    return [
+        catalog[correlation.get_required_columns(catalog.hc_structure.catalog_info)] for catalog in catalogs
+    ]
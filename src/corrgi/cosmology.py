@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import warnings
+
+import numpy as np
+from astropy.cosmology import FLRW
+
+# Bounds on the number of redshift samples of the comoving distance tables
+MIN_TABLE_SIZE = 64
+MAX_TABLE_SIZE = 2**22
+
+
+class ComovingDistanceTable:
+    """Lookup table to interpolate the comoving distances of a cosmology.
+
+    The table samples the comoving distance at evenly spaced redshifts, doubling
+    the number of samples until the linear interpolation at the midpoints of the
+    samples is within the tolerance of the exact distances. Redshifts outside of
+    the table range fall back to the exact computation.
+
+    The tolerance is relative to the largest distance of the table, rather than to
+    each distance, which would require ever more samples as the distances approach
+    zero (at z=0). The error of the interpolated distances is then at most `max_error`
+    Mpc, which is what bounds the error of the separations of the pairs.
+
+    Args:
+        cosmo (FLRW): The astropy cosmology.
+        min_redshift (float): The smallest redshift of the table.
+        max_redshift (float): The largest redshift of the table.
+        tolerance (float): The maximum error of the interpolated distances, relative
+            to the largest distance of the table.
+    """
+
+    def __init__(self, cosmo: FLRW, min_redshift: float, max_redshift: float, tolerance: float):
+        self.cosmo = cosmo
+        self.min_redshift = min_redshift
+        self.max_redshift = max(max_redshift, min_redshift + tolerance)
+        self.tolerance = tolerance
+        self.max_error = tolerance * np.abs(self._compute_exact(self.max_redshift))
+        self.redshifts, self.distances = self._make_table()
+
+    def _make_table(self) -> tuple[np.ndarray, np.ndarray]:
+        """Samples the comoving distances until their interpolation is within tolerance"""
+        num_samples = MIN_TABLE_SIZE
+        redshifts = np.linspace(self.min_redshift, self.max_redshift, num_samples + 1)
+        distances = self._compute_exact(redshifts)
+        while True:
+            midpoints = 0.5 * (redshifts[1:] + redshifts[:-1])
+            exact = self._compute_exact(midpoints)
+            interpolated = 0.5 * (distances[1:] + distances[:-1])
+            error = np.max(np.abs(interpolated - exact))
+            if error <= self.max_error:
+                break
+            if num_samples >= MAX_TABLE_SIZE:
+                warnings.warn(
+                    f"The comoving distance table reached its maximum size ({MAX_TABLE_SIZE} samples) "
+                    f"with an error of {error:.3g} Mpc, above the tolerance of {self.max_error:.3g} Mpc"
+                )
+                self.max_error = error
+                break
+            # Interleave the midpoints to double the number of samples
+            redshifts = np.insert(redshifts, np.arange(1, len(redshifts)), midpoints)
+            distances = np.insert(distances, np.arange(1, len(distances)), exact)
+            num_samples *= 2
+        return redshifts, distances
+
+    def _compute_exact(self, redshifts: np.ndarray) -> np.ndarray:
+        """The exact comoving distances, in Mpc"""
+        return self.cosmo.comoving_distance(redshifts).value
+
+    def covers(self, min_redshift: float, max_redshift: float) -> bool:
+        """Whether the table covers the provided range of redshifts"""
+        return self.min_redshift <= min_redshift and max_redshift <= self.max_redshift
+
+    def __call__(self, redshifts: np.ndarray) -> np.ndarray:
+        """Interpolates the comoving distances, in Mpc, of the provided redshifts"""
+        distances = np.interp(redshifts, self.redshifts, self.distances)
+        outside = ~((redshifts >= self.min_redshift) & (redshifts <= self.max_redshift))
+        if np.any(outside):
+            distances[outside] = self._compute_exact(redshifts[outside])
+        return distances
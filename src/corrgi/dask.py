@@ -1,67 +1,510 @@
+import time
+
 import dask
 import numpy as np
 import pandas as pd
+from dask.delayed import Delayed
 from dask.distributed import print as dask_print
 from hipscat.catalog.catalog_info import CatalogInfo
 from hipscat.pixel_math import HealpixPixel
 from lsdb import Catalog
-from lsdb.dask.merge_catalog_functions import align_and_apply, get_healpix_pixels_from_alignment
+from lsdb.dask.merge_catalog_functions import get_healpix_pixels_from_alignment
 
 from corrgi.alignment import autocorrelation_alignment, crosscorrelation_alignment
 from corrgi.correlation.correlation import Correlation
-from corrgi.utils import join_count_histograms
+from corrgi.scheduling import Chunk, get_chunk, order_pairs_by_owner, schedule_pair_blocks
+from corrgi.utils import get_partition_sizes
+
+# The default number of partial histograms reduced by each accumulator task
+DEFAULT_FAN_IN = 16
+
+# The columns of the report of the instrumented counting tasks
+TASK_REPORT_COLUMNS = [
+    "term",
+    "task",
+    "left_pixel",
+    "right_pixel",
+    "left_rows",
+    "right_rows",
+    "left_prepare_time",
+    "right_prepare_time",
+    "count_time",
+    "num_pairs",
+]
 
 
-def perform_auto_counts(catalog: Catalog, *args) -> np.ndarray:
+def perform_auto_counts(
+    catalog: Catalog, correlation: Correlation, points: dict[HealpixPixel, Delayed] | None = None
+) -> np.ndarray:
     """Aligns the pixel of a single catalog and performs the pairs counting.
 
+    Pairs of partitions that are farther apart than the maximum separation of
+    the correlation are not aligned, as they cannot contribute to the counts.
+    Each partition is prepared once and shared by all the pairs it takes part in.
+
     Args:
         catalog (Catalog): The catalog.
-        *args: The arguments to pass to the counting methods.
+        correlation (Correlation): The correlation instance.
+        points (dict[HealpixPixel, Delayed] | None): The prepared partitions of the
+            catalog, if they are shared with other parts of the graph.
+
+    Returns:
+        The histogram with the sample distance counts.
+    """
+    _, partials = make_auto_partials(catalog, correlation, points)
+    return join_pair_histograms(partials, correlation.params.get("fan_in", DEFAULT_FAN_IN))
+
+
+def perform_cross_counts(
+    left: Catalog,
+    right: Catalog,
+    correlation: Correlation,
+    left_points: dict[HealpixPixel, Delayed] | None = None,
+    right_points: dict[HealpixPixel, Delayed] | None = None,
+) -> np.ndarray:
+    """Aligns the pixel of two catalogs and performs the pairs counting.
+
+    Pairs of partitions that are farther apart than the maximum separation of
+    the correlation are not aligned, as they cannot contribute to the counts.
+    Each partition is prepared once and shared by all the pairs it takes part in.
+
+    Args:
+        left (Catalog): The left catalog.
+        right (Catalog): The right catalog.
+        correlation (Correlation): The correlation instance.
+        left_points (dict[HealpixPixel, Delayed] | None): The prepared partitions of
+            the left catalog, if they are shared with other parts of the graph.
+        right_points (dict[HealpixPixel, Delayed] | None): The prepared partitions of
+            the right catalog, if they are shared with other parts of the graph.
 
     Returns:
         The histogram with the sample distance counts.
     """
+    _, partials = make_cross_partials(left, right, correlation, left_points, right_points)
+    if len(partials) == 0:
+        # No pair of partitions is close enough to hold any pair of objects
+        return correlation.make_empty_counts()
+    return join_pair_histograms(partials, correlation.params.get("fan_in", DEFAULT_FAN_IN))
+
+
+def make_auto_partials(
+    catalog: Catalog,
+    correlation: Correlation,
+    points: dict[HealpixPixel, Delayed] | None = None,
+    records: list[Delayed] | None = None,
+) -> tuple[list[list[tuple[HealpixPixel, HealpixPixel]]], list[Delayed]]:
+    """Creates the partial counts for the pairs of partitions of a single catalog.
+
+    Args:
+        catalog (Catalog): The catalog.
+        correlation (Correlation): The correlation instance.
+        points (dict[HealpixPixel, Delayed] | None): The prepared partitions of the
+            catalog, if they are shared with other parts of the graph.
+        records (list[Delayed] | None): The list where the records of the counting
+            tasks are added, if they are instrumented (see `make_pair_partials`).
+
+    Returns:
+        The pairs of pixels that are counted by each task, and the delayed partial
+        histograms of the tasks, stacked with one histogram per pair of pixels.
+    """
+    correlation.setup([catalog])
+    if points is None:
+        points = prepare_partitions(catalog, correlation)
     # Get counts between points of different partitions
-    alignment = autocorrelation_alignment(catalog.hc_structure)
+    max_separation = correlation.get_max_angular_separation([catalog])
+    alignment = autocorrelation_alignment(catalog.hc_structure, max_separation)
     left_pixels, right_pixels = get_healpix_pixels_from_alignment(alignment)
-    cross_partials = align_and_apply(
-        [(catalog, left_pixels), (catalog, right_pixels)], count_cross_pairs, *args
-    )
+    pixel_pairs = correlation.prune_pixel_pairs(catalog, catalog, list(zip(left_pixels, right_pixels)))
     # Get counts between points of the same partition
-    auto_partials = [
-        count_auto_pairs(partition, catalog.hc_structure.catalog_info, *args)
-        for partition in catalog._ddf.to_delayed()
-    ]
-    all_partials = [*cross_partials, *auto_partials]
-    return join_count_histograms(all_partials)
+    auto_pairs = [False] * len(pixel_pairs) + [True] * len(points)
+    pixel_pairs += [(pixel, pixel) for pixel in points]
+    sizes = get_partition_sizes(catalog)
+    return make_pair_partials(pixel_pairs, auto_pairs, points, points, sizes, sizes, correlation, records)
 
 
-def perform_cross_counts(left: Catalog, right: Catalog, *args) -> np.ndarray:
-    """Aligns the pixel of two catalogs and performs the pairs counting.
+def make_cross_partials(
+    left: Catalog,
+    right: Catalog,
+    correlation: Correlation,
+    left_points: dict[HealpixPixel, Delayed] | None = None,
+    right_points: dict[HealpixPixel, Delayed] | None = None,
+    records: list[Delayed] | None = None,
+) -> tuple[list[list[tuple[HealpixPixel, HealpixPixel]]], list[Delayed]]:
+    """Creates the partial counts for the pairs of partitions of two catalogs.
 
     Args:
         left (Catalog): The left catalog.
         right (Catalog): The right catalog.
-        *args: The arguments to pass to the count_pairs method.
+        correlation (Correlation): The correlation instance.
+        left_points (dict[HealpixPixel, Delayed] | None): The prepared partitions of
+            the left catalog, if they are shared with other parts of the graph.
+        right_points (dict[HealpixPixel, Delayed] | None): The prepared partitions of
+            the right catalog, if they are shared with other parts of the graph.
+        records (list[Delayed] | None): The list where the records of the counting
+            tasks are added, if they are instrumented (see `make_pair_partials`).
 
     Returns:
-        The histogram with the sample distance counts.
+        The pairs of pixels that are counted by each task, and the delayed partial
+        histograms of the tasks, stacked with one histogram per pair of pixels.
     """
-    alignment = crosscorrelation_alignment(left.hc_structure, right.hc_structure)
+    max_separation = correlation.get_max_angular_separation([left, right])
+    alignment = crosscorrelation_alignment(left.hc_structure, right.hc_structure, max_separation)
     left_pixels, right_pixels = get_healpix_pixels_from_alignment(alignment)
-    cross_partials = align_and_apply([(left, left_pixels), (right, right_pixels)], count_cross_pairs, *args)
-    return join_count_histograms(cross_partials)
+    if len(left_pixels) == 0:
+        return [], []
+    correlation.setup([left, right])
+    if left_points is None:
+        left_points = prepare_partitions(left, correlation)
+    if right_points is None:
+        right_points = prepare_partitions(right, correlation)
+    pixel_pairs = correlation.prune_pixel_pairs(left, right, list(zip(left_pixels, right_pixels)))
+    if len(pixel_pairs) == 0:
+        return [], []
+    return make_pair_partials(
+        pixel_pairs,
+        [False] * len(pixel_pairs),
+        left_points,
+        right_points,
+        get_partition_sizes(left),
+        get_partition_sizes(right),
+        correlation,
+        records,
+    )
 
 
-@dask.delayed
-def count_auto_pairs(
-    df: pd.DataFrame,
-    catalog_info: CatalogInfo,
+def make_pair_partials(
+    pixel_pairs: list[tuple[HealpixPixel, HealpixPixel]],
+    auto_pairs: list[bool],
+    left_points: dict[HealpixPixel, Delayed],
+    right_points: dict[HealpixPixel, Delayed],
+    left_sizes: dict[HealpixPixel, int] | None,
+    right_sizes: dict[HealpixPixel, int] | None,
     correlation: Correlation,
-) -> np.ndarray:
-    """Calls the fortran routine to compute the counts for pairs of
-    partitions belonging to the same catalog.
+    records: list[Delayed] | None = None,
+) -> tuple[list[list[tuple[HealpixPixel, HealpixPixel]]], list[Delayed]]:
+    """Creates the counting tasks for pairs of partitions, with roughly uniform costs.
+
+    The cost of each pair is estimated from the sizes of its partitions: expensive
+    pairs are split in blocks and cheap pairs are batched in the same task (see
+    `schedule_pair_blocks`). The target cost of the tasks may be set with the
+    `task_cost` parameter.
+
+    The pairs are grouped by the partition that owns them (see `order_pairs_by_owner`),
+    and the tasks are prioritized in the order of their owners. Each prepared partition
+    is then held in the memory of the worker that counts its pairs, its neighbours are
+    only moved there once, and it is released once all the pairs that touch it are counted,
+    instead of being moved between the workers for every pair it takes part in.
+
+    Args:
+        pixel_pairs (list[tuple[HealpixPixel, HealpixPixel]]): The pairs of pixels to count.
+        auto_pairs (list[bool]): Whether each pair holds the auto-counts of a single partition.
+        left_points (dict[HealpixPixel, Delayed]): The prepared partitions of the left catalog.
+        right_points (dict[HealpixPixel, Delayed]): The prepared partitions of the right catalog.
+        left_sizes (dict[HealpixPixel, int] | None): The sizes of the partitions of the left
+            catalog, or None if they are unknown.
+        right_sizes (dict[HealpixPixel, int] | None): The sizes of the partitions of the right
+            catalog, or None if they are unknown.
+        correlation (Correlation): The correlation instance.
+        records (list[Delayed] | None): The list where the records of the counting tasks
+            are added. If set, the tasks are instrumented and also record the sizes, time
+            and number of pairs in range of their blocks (see `count_pairs_with_records`).
+
+    Returns:
+        The pairs of pixels that are counted by each task, and the delayed partial
+        histograms of the tasks, stacked with one histogram per pair of pixels.
+    """
+    left_ranks = {pixel: rank for rank, pixel in enumerate(left_points)}
+    right_ranks = {pixel: rank for rank, pixel in enumerate(right_points)}
+    order, owners = order_pairs_by_owner(
+        [(left_ranks[left_pixel], right_ranks[right_pixel]) for left_pixel, right_pixel in pixel_pairs],
+        symmetric=left_points is right_points,
+    )
+    pixel_pairs = [pixel_pairs[index] for index in order]
+    auto_pairs = [auto_pairs[index] for index in order]
+    owners = [owners[index] for index in order]
+    pair_sizes = [
+        (
+            left_sizes[left_pixel] if left_sizes is not None else None,
+            right_sizes[right_pixel] if right_sizes is not None else None,
+            auto,
+        )
+        for (left_pixel, right_pixel), auto in zip(pixel_pairs, auto_pairs)
+    ]
+    tasks = schedule_pair_blocks(pair_sizes, correlation.params.get("task_cost"))
+    shared_correlation = share_correlation(correlation)
+    task_pixel_pairs, partials = [], []
+    for task in tasks:
+        blocks = []
+        for index, left_chunk, right_chunk in task:
+            left_pixel, right_pixel = pixel_pairs[index]
+            right = right_points[right_pixel] if right_chunk is not None else None
+            blocks.append((left_points[left_pixel], left_chunk, right, right_chunk))
+        task_pixel_pairs.append([pixel_pairs[index] for index, _, _ in task])
+        with dask.annotate(priority=-owners[task[0][0]]):
+            if records is None:
+                partials.append(count_pairs(blocks, shared_correlation))
+            else:
+                partial, task_records = count_pairs_with_records(
+                    blocks, task_pixel_pairs[-1], shared_correlation
+                )
+                partials.append(partial)
+                records.append(task_records)
+    return task_pixel_pairs, partials
+
+
+def share_correlation(correlation: Correlation) -> Delayed:
+    """Places the correlation in the graph as a single key, which its tasks depend on.
+
+    The correlation is then sent once to each worker, instead of being pickled in every
+    task along with its tables (e.g. the comoving distances of spatial correlations).
+
+    Args:
+        correlation (Correlation): The correlation instance, already set up for the catalogs.
+
+    Returns:
+        The delayed correlation.
+    """
+    return dask.delayed(correlation, pure=True)
+
+
+def prepare_partitions(catalog: Catalog, correlation: Correlation) -> dict[HealpixPixel, Delayed]:
+    """Creates the tasks that map each partition of a catalog to the compact
+    array of values needed by the pairing methods.
+
+    Args:
+        catalog (Catalog): The catalog.
+        correlation (Correlation): The correlation instance.
+
+    Returns:
+        A dictionary with the delayed prepared partition for each pixel, in
+        the order of the catalog partitions.
+    """
+    partitions = catalog._ddf.to_delayed()
+    catalog_info = catalog.hc_structure.catalog_info
+    pixels = sorted(catalog._ddf_pixel_map, key=catalog._ddf_pixel_map.get)
+    shared_correlation = share_correlation(correlation)
+    return {
+        pixel: prepare_partition(partitions[catalog._ddf_pixel_map[pixel]], catalog_info, shared_correlation)
+        for pixel in pixels
+    }
+
+
+def prepare_partitions_with_records(
+    catalog: Catalog, correlation: Correlation
+) -> tuple[dict[HealpixPixel, Delayed], dict[HealpixPixel, Delayed]]:
+    """Creates the tasks that prepare each partition of a catalog, as `prepare_partitions`,
+    which also record the number of points of the partitions and the time spent preparing them.
+
+    Args:
+        catalog (Catalog): The catalog.
+        correlation (Correlation): The correlation instance.
+
+    Returns:
+        The dictionaries with the delayed prepared partition, and with the delayed
+        record of its preparation, for each pixel.
+    """
+    partitions = catalog._ddf.to_delayed()
+    catalog_info = catalog.hc_structure.catalog_info
+    pixels = sorted(catalog._ddf_pixel_map, key=catalog._ddf_pixel_map.get)
+    shared_correlation = share_correlation(correlation)
+    points, records = {}, {}
+    for pixel in pixels:
+        points[pixel], records[pixel] = prepare_partition_with_record(
+            partitions[catalog._ddf_pixel_map[pixel]], catalog_info, shared_correlation
+        )
+    return points, records
+
+
+@dask.delayed
+def make_task_report(
+    terms: list[tuple[str, list[list[dict]], dict[HealpixPixel, dict], dict[HealpixPixel, dict]]],
+) -> pd.DataFrame:
+    """Gathers the records of the instrumented counting tasks in a single report.
+
+    Args:
+        terms (list[tuple[str, list[list[dict]], dict[HealpixPixel, dict], dict[HealpixPixel, dict]]]):
+            The name of each term, the records of its counting tasks and the records of
+            the preparation of the partitions of its left and right catalogs.
+
+    Returns:
+        The DataFrame with one row per block of pairs of partitions counted, with
+        the term and task it belongs to, its pixels and numbers of points, the time spent
+        preparing its partitions and counting its pairs, and the number of pairs in range.
+    """
+    rows = []
+    for term, task_records, left_records, right_records in terms:
+        for task, records in enumerate(task_records):
+            for record in records:
+                rows.append(
+                    {
+                        "term": term,
+                        "task": task,
+                        **record,
+                        "left_prepare_time": left_records[record["left_pixel"]]["prepare_time"],
+                        "right_prepare_time": right_records[record["right_pixel"]]["prepare_time"],
+                    }
+                )
+    return pd.DataFrame(rows, columns=TASK_REPORT_COLUMNS)
+
+
+def compute_catalog_stats(points: dict[HealpixPixel, Delayed], correlation: Correlation) -> Delayed:
+    """Computes the statistics of a catalog from its prepared partitions, in the
+    same graph as the pair counts, to avoid scanning the catalog separately.
+
+    Args:
+        points (dict[HealpixPixel, Delayed]): The prepared partitions of the catalog.
+        correlation (Correlation): The correlation instance.
+
+    Returns:
+        The delayed array with the number of points of the catalog, and the sums
+        of their weights and squared weights.
+    """
+    shared_correlation = share_correlation(correlation)
+    partials = [compute_partition_stats(partition, shared_correlation) for partition in points.values()]
+    return join_count_histograms(partials, correlation.params.get("fan_in", DEFAULT_FAN_IN))
+
+
+def join_count_histograms(partial_histograms: list[Delayed], fan_in: int = DEFAULT_FAN_IN) -> Delayed:
+    """Sums the partial histograms with a tree of accumulator tasks.
+
+    Each accumulator adds up to `fan_in` histograms, so the reduction has a depth
+    of ceil(log_fan_in(P)) levels for P partials, and only a few histograms need
+    to be held in memory by each task. The histograms are grouped in their original
+    order, so the result is deterministic for a given fan-in. It may differ, by the
+    rounding of the additions, from a sequential sum or a sum with another fan-in.
+
+    Args:
+        partial_histograms (list[Delayed]): The count histograms generated for
+            each pair of partitions.
+        fan_in (int): The number of histograms reduced by each accumulator task.
+            Defaults to DEFAULT_FAN_IN.
+
+    Returns:
+        The delayed histogram with the total counts of the partial histograms.
+    """
+    if fan_in < 2:
+        raise ValueError("The fan-in of the reduction must be at least 2")
+    level = list(partial_histograms)
+    while len(level) > 1:
+        level = [
+            accumulate_count_histograms(*level[start : start + fan_in])
+            for start in range(0, len(level), fan_in)
+        ]
+    return level[0]
+
+
+def join_pair_histograms(partial_histograms: list[Delayed], fan_in: int = DEFAULT_FAN_IN) -> Delayed:
+    """Sums the stacked partial histograms of the counting tasks with a tree of
+    accumulator tasks.
+
+    The first level of accumulators sums the stacks of `fan_in` counting tasks, and
+    the rest of the tree sums their totals (see `join_count_histograms`).
+
+    Args:
+        partial_histograms (list[Delayed]): The count histograms generated by each
+            counting task, stacked with one histogram per pair of partitions.
+        fan_in (int): The number of partials reduced by each accumulator task.
+            Defaults to DEFAULT_FAN_IN.
+
+    Returns:
+        The delayed histogram with the total counts of the partial histograms.
+    """
+    if fan_in < 2:
+        raise ValueError("The fan-in of the reduction must be at least 2")
+    totals = [
+        accumulate_pair_histograms(*partial_histograms[start : start + fan_in])
+        for start in range(0, len(partial_histograms), fan_in)
+    ]
+    return join_count_histograms(totals, fan_in)
+
+
+def join_resampled_histograms(
+    partial_histograms: list[Delayed], weights: list[np.ndarray], fan_in: int = DEFAULT_FAN_IN
+) -> Delayed:
+    """Sums the stacked partial histograms, weighted for each resampling, with a
+    tree of accumulator tasks.
+
+    The first level of accumulators weights and sums the stacks of `fan_in` counting
+    tasks, and the rest of the tree sums their totals (see `join_count_histograms`).
+
+    Args:
+        partial_histograms (list[Delayed]): The count histograms generated by each
+            counting task, stacked with one histogram per pair of partitions.
+        weights (list[np.ndarray]): The weight of each histogram of the partials, for
+            each of the resamplings, with shape (number of histograms, number of samples).
+        fan_in (int): The number of partials reduced by each accumulator task.
+            Defaults to DEFAULT_FAN_IN.
+
+    Returns:
+        The delayed histogram with the resampled counts, with an additional
+        last dimension for the samples.
+    """
+    if fan_in < 2:
+        raise ValueError("The fan-in of the reduction must be at least 2")
+    totals = [
+        accumulate_resampled_histograms(
+            weights[start : start + fan_in], *partial_histograms[start : start + fan_in]
+        )
+        for start in range(0, len(partial_histograms), fan_in)
+    ]
+    return join_count_histograms(totals, fan_in)
+
+
+@dask.delayed
+def accumulate_count_histograms(*partial_histograms: np.ndarray) -> np.ndarray:
+    """Adds partial histograms, in order, into a new total.
+
+    Args:
+       *partial_histograms (np.ndarray): The partial histograms to add.
+
+    Returns:
+       The total of the counts.
+    """
+    total = np.array(partial_histograms[0], copy=True)
+    for histogram in partial_histograms[1:]:
+        total += histogram
+    return total
+
+
+@dask.delayed
+def accumulate_pair_histograms(*partial_histograms: np.ndarray) -> np.ndarray:
+    """Adds the stacked histograms of counting tasks, in order, into a new total.
+
+    Args:
+       *partial_histograms (np.ndarray): The stacked histograms to add.
+
+    Returns:
+       The total of the counts.
+    """
+    total = None
+    for histograms in partial_histograms:
+        for histogram in histograms:
+            total = np.array(histogram, copy=True) if total is None else total + histogram
+    return total
+
+
+@dask.delayed
+def accumulate_resampled_histograms(weights: list[np.ndarray], *partial_histograms: np.ndarray) -> np.ndarray:
+    """Adds stacked histograms, weighted for each resampling, into a new total.
+
+    Args:
+       weights (list[np.ndarray]): The weights of the stacked histograms for each sample.
+       *partial_histograms (np.ndarray): The stacked histograms to add.
+
+    Returns:
+       The total of the resampled counts.
+    """
+    total = None
+    for histograms, histograms_weights in zip(partial_histograms, weights):
+        for histogram, histogram_weights in zip(histograms, histograms_weights):
+            resampled = np.multiply.outer(histogram, histogram_weights)
+            total = resampled if total is None else total + resampled
+    return total
+
+
+@dask.delayed
+def prepare_partition(df: pd.DataFrame, catalog_info: CatalogInfo, correlation: Correlation) -> np.ndarray:
+    """Maps a partition to the compact array of values needed by the pairing methods.
 
     Args:
        df (pd.DataFrame): The partition dataframe.
@@ -69,47 +512,131 @@ def count_auto_pairs(
        correlation (Correlation): The correlation instance.
 
     Returns:
-       The count histogram for the partition pair.
+       The prepared values for the points of the partition.
     """
     try:
-        return correlation.count_auto_pairs(df, catalog_info)
+        return correlation.prepare_partition(df, catalog_info)
+    except Exception as exception:
+        dask_print(exception)
+        raise exception
+
+
+@dask.delayed(nout=2)
+def prepare_partition_with_record(
+    df: pd.DataFrame, catalog_info: CatalogInfo, correlation: Correlation
+) -> tuple[np.ndarray, dict]:
+    """Maps a partition to the compact array of values needed by the pairing methods,
+    and records the number of its points and the time spent preparing them.
+
+    Args:
+       df (pd.DataFrame): The partition dataframe.
+       catalog_info (CatalogInfo): The catalog metadata.
+       correlation (Correlation): The correlation instance.
+
+    Returns:
+       The prepared values for the points of the partition, and the record.
+    """
+    try:
+        start = time.perf_counter()
+        points = correlation.prepare_partition(df, catalog_info)
+        return points, {"rows": points.shape[1], "prepare_time": time.perf_counter() - start}
     except Exception as exception:
         dask_print(exception)
         raise exception
 
 
 @dask.delayed
-def count_cross_pairs(
-    left_df: pd.DataFrame,
-    right_df: pd.DataFrame,
-    left_pix: HealpixPixel,
-    right_pix: HealpixPixel,
-    left_catalog_info: CatalogInfo,
-    right_catalog_info: CatalogInfo,
-    correlation: Correlation,
+def compute_partition_stats(points: np.ndarray, correlation: Correlation) -> np.ndarray:
+    """Computes the number of points of a prepared partition, and the sums of
+    their weights and squared weights.
+
+    Args:
+       points (np.ndarray): The prepared values of the partition.
+       correlation (Correlation): The correlation instance.
+
+    Returns:
+       The array with the statistics of the partition.
+    """
+    try:
+        return correlation.compute_partition_stats(points)
+    except Exception as exception:
+        dask_print(exception)
+        raise exception
+
+
+@dask.delayed
+def count_pairs(
+    blocks: list[tuple[np.ndarray, Chunk, np.ndarray | None, Chunk | None]], correlation: Correlation
 ) -> np.ndarray:
-    """Calls the fortran routine to compute the counts for pairs of
-    partitions belonging to two different catalogs.
+    """Calls the fortran routines to compute the counts for blocks of pairs of partitions.
 
     Args:
-       left_df (pd.DataFrame): The left partition dataframe.
-       right_df (pd.DataFrame): The right partition dataframe.
-       left_pix (HealpixPixel): The pixel corresponding to `left_df`.
-       right_pix (HealpixPixel): The pixel corresponding to `right_df`.
-       left_catalog_info (CatalogInfo): The left catalog metadata.
-       right_catalog_info (CatalogInfo): The right catalog metadata.
+       blocks (list[tuple[np.ndarray, Chunk, np.ndarray | None, Chunk | None]]): The
+           prepared values of the left partition and the chunk of its points, and those
+           of the right partition, of each block. The right partition is None for the
+           pairs within a chunk of a partition.
        correlation (Correlation): The correlation instance.
 
     Returns:
-       The count histogram for the partition pair.
+       The count histograms of the blocks, stacked along the first axis.
     """
     try:
-        return correlation.count_cross_pairs(
-            left_df,
-            right_df,
-            left_catalog_info,
-            right_catalog_info,
-        )
+        return np.stack([count_block_pairs(block, correlation) for block in blocks])
     except Exception as exception:
         dask_print(exception)
         raise exception
+
+
+@dask.delayed(nout=2)
+def count_pairs_with_records(
+    blocks: list[tuple[np.ndarray, Chunk, np.ndarray | None, Chunk | None]],
+    pixel_pairs: list[tuple[HealpixPixel, HealpixPixel]],
+    correlation: Correlation,
+) -> tuple[np.ndarray, list[dict]]:
+    """Computes the counts for blocks of pairs of partitions, as `count_pairs`, and
+    records the sizes of the blocks, the time spent counting them and the number of
+    pairs in range (the total of their histograms, weighted if weights are used).
+
+    Args:
+       blocks (list[tuple[np.ndarray, Chunk, np.ndarray | None, Chunk | None]]): The
+           prepared partitions, and their chunks, of each block (see `count_pairs`).
+       pixel_pairs (list[tuple[HealpixPixel, HealpixPixel]]): The pair of pixels of each block.
+       correlation (Correlation): The correlation instance.
+
+    Returns:
+       The count histograms of the blocks, stacked along the first axis, and their records.
+    """
+    try:
+        histograms, records = [], []
+        for block, (left_pixel, right_pixel) in zip(blocks, pixel_pairs):
+            left_points, left_chunk, right_points, right_chunk = block
+            start = time.perf_counter()
+            histograms.append(count_block_pairs(block, correlation))
+            count_time = time.perf_counter() - start
+            left_rows = get_chunk(left_points, left_chunk).shape[1]
+            right_rows = left_rows if right_points is None else get_chunk(right_points, right_chunk).shape[1]
+            records.append(
+                {
+                    "left_pixel": left_pixel,
+                    "right_pixel": right_pixel,
+                    "left_rows": left_rows,
+                    "right_rows": right_rows,
+                    "count_time": count_time,
+                    "num_pairs": float(np.sum(histograms[-1])),
+                }
+            )
+        return np.stack(histograms), records
+    except Exception as exception:
+        dask_print(exception)
+        raise exception
+
+
+def count_block_pairs(
+    block: tuple[np.ndarray, Chunk, np.ndarray | None, Chunk | None], correlation: Correlation
+) -> np.ndarray:
+    """Counts the pairs of a block, within a chunk of a partition or between chunks of two"""
+    left_points, left_chunk, right_points, right_chunk = block
+    left_points = get_chunk(left_points, left_chunk)
+    if right_points is None:
+        return correlation.count_prepared_auto_pairs(left_points)
+    return correlation.count_prepared_cross_pairs(left_points, get_chunk(right_points, right_chunk))
@@ -1,28 +1,41 @@
 from __future__ import annotations
 
-import dask
 import numpy as np
+from dask.delayed import Delayed
 from lsdb import Catalog
 
-from corrgi.dask import perform_cross_counts
 from corrgi.estimators.estimator import Estimator
+from corrgi.plan import CountsPlan
 
 
 class DavisPeeblesEstimator(Estimator):
     """Davis-Peebles Estimator"""
 
-    def compute_autocorrelation_counts(
-        self, catalog: Catalog, random: Catalog
-    ) -> list[np.ndarray, np.ndarray, np.ndarray | int]:
-        """Computes the auto-correlation counts for the provided catalog"""
-        raise NotImplementedError()
+    def make_autocorrelation_counts(
+        self, plan: CountsPlan, catalog: Catalog, random: Catalog
+    ) -> list[Delayed | np.ndarray | int]:
+        """Plans the auto-correlation counts for the provided catalog (`DD/DR - 1`).
 
-    def compute_crosscorrelation_counts(
-        self, left: Catalog, right: Catalog, random: Catalog
-    ) -> list[np.ndarray, np.ndarray]:
-        """Computes the cross-correlation counts for the provided catalog.
+        Args:
+            plan (CountsPlan): The plan of the counts graph.
+            catalog (Catalog): A galaxy samples catalog (D).
+            random (Catalog): A random samples catalog (R).
+
+        Returns:
+            The DD, RR and DR counts for the DP estimator.
+        """
+        counts_dd = plan.get_auto_counts(catalog)
+        counts_rr = 0  # The DP estimator does not use RR counts
+        counts_dr = plan.get_cross_counts(catalog, random)
+        return [counts_dd, counts_rr, counts_dr]
+
+    def make_crosscorrelation_counts(
+        self, plan: CountsPlan, left: Catalog, right: Catalog, random: Catalog
+    ) -> list[Delayed | np.ndarray]:
+        """Plans the cross-correlation counts for the provided catalog.
 
         Args:
+            plan (CountsPlan): The plan of the counts graph.
             left (Catalog): A left galaxy samples catalog (D).
             right (Catalog): A right galaxy samples catalog (C).
             random (Catalog): A random samples catalog (R).
@@ -30,7 +43,6 @@ class DavisPeeblesEstimator(Estimator):
         Returns:
             The CD and CR counts for the DP estimator.
         """
-        counts_cd = perform_cross_counts(right, left, self.correlation)
-        counts_cr = perform_cross_counts(right, random, self.correlation)
-        counts_cd_cr = dask.compute(*[counts_cd, counts_cr])
-        return self.correlation.transform_counts(counts_cd_cr)
+        counts_cd = plan.get_cross_counts(right, left)
+        counts_cr = plan.get_cross_counts(right, random, cached=True)
+        return [counts_cd, counts_cr]
@@ -4,71 +4,264 @@ from abc import ABC, abstractmethod
 from typing import Callable
 
 import numpy as np
+from dask.delayed import Delayed
 from gundam.gundam import tpccf, tpccf_wrp, tpcf, tpcf_wrp
 from lsdb import Catalog
 
+from corrgi.cache import CountsCache
 from corrgi.correlation.correlation import Correlation
 from corrgi.correlation.projected_correlation import ProjectedCorrelation
-from corrgi.utils import compute_catalog_size
+from corrgi.plan import CountsPlan
 
 
 class Estimator(ABC):
     """Estimator base class"""
 
-    def __init__(self, correlation: Correlation):
+    def __init__(self, correlation: Correlation, cache: CountsCache | None = None):
         self.correlation = correlation
+        self.cache = cache
+        # The plan of the last computation, with the report of its tasks if they are instrumented
+        self.plan: CountsPlan | None = None
 
-    def compute_auto_estimate(self, catalog: Catalog, random: Catalog) -> np.ndarray:
+    def compute_auto_estimate(
+        self, catalog: Catalog, random: Catalog, return_covariance: bool = False
+    ) -> np.ndarray | tuple[np.ndarray, np.ndarray]:
         """Computes the auto-correlation for this estimator.
 
+        The pair counts, the sizes of the catalogs and, for the covariance, the resampled
+        counts are computed in a single graph. With weights, the counts are normalized
+        by the sums of the weights of the pairs.
+
+        Each resampled estimate is computed from the DD and DR counts of the resampled
+        data, normalized by the statistics of that sample, and from the RR counts of
+        the whole random catalog.
+
         Args:
             catalog (Catalog): The catalog of galaxy samples (D).
             random (Catalog): The catalog of random samples (R).
+            return_covariance (bool): Whether to also return the covariance of the
+                estimate, from the resampled counts (`doboot`). Defaults to False.
 
         Returns:
-            The statistical estimate of the auto-correlation function, as a numpy array.
+            The statistical estimate of the auto-correlation function, as a numpy array,
+            and its covariance matrix if `return_covariance` is set.
         """
-        num_galaxies = compute_catalog_size(catalog)
-        num_random = compute_catalog_size(random)
-        dd, rr, dr = self.compute_autocorrelation_counts(catalog, random)
-        args = self._get_auto_args(num_galaxies, num_random, dd, rr, dr)
+        plan = self.make_plan([catalog, random], resampled_catalogs=[catalog])
+        self._check_resampling(plan, return_covariance)
+        counts = self.make_autocorrelation_counts(plan, catalog, random)
+        resampled = (
+            self.make_resampled_autocorrelation_counts(plan, catalog, random, counts)
+            if return_covariance
+            else []
+        )
+        *counts, catalog_stats, random_stats, resampled = plan.compute(
+            *counts, plan.get_stats(catalog), plan.get_stats(random), resampled
+        )
+        counts = self._transform_counts(counts)
+        dd, rr, dr = self._normalize_auto_counts(counts, catalog_stats, random_stats)
+        num_random = int(random_stats[0])
+        args = self._get_auto_args(int(catalog_stats[0]), num_random, dd, rr, dr)
         estimate, _ = self._get_auto_subroutine()(*args)
-        return estimate
+        if not return_covariance:
+            return estimate
+        *resampled_counts, sample_stats = resampled
+        bdd, bdr = self._transform_counts(resampled_counts, resampled=True)
+        sample_estimates = []
+        for i in range(plan.resampling.num_samples):
+            sample_counts = [bdd[..., i], counts[1], self._get_sample(bdr, i)]
+            sample_dd, sample_rr, sample_dr = self._normalize_auto_counts(
+                sample_counts, sample_stats[:, i], random_stats
+            )
+            args = self._get_auto_args(int(sample_stats[0, i]), num_random, sample_dd, sample_rr, sample_dr)
+            sample_estimates.append(self._get_auto_subroutine()(*args)[0])
+        return estimate, plan.resampling.compute_covariance(np.array(sample_estimates))
 
-    def compute_cross_estimate(self, left: Catalog, right: Catalog, random: Catalog) -> np.ndarray:
+    def compute_cross_estimate(
+        self, left: Catalog, right: Catalog, random: Catalog, return_covariance: bool = False
+    ) -> np.ndarray | tuple[np.ndarray, np.ndarray]:
         """Computes the cross-correlation for this estimator.
 
+        The pair counts, the sizes of the catalogs and, for the covariance, the resampled
+        counts are computed in a single graph. With weights, the counts are normalized
+        by the sums of the weights of the pairs.
+
+        Both galaxy catalogs are resampled with the same regions. Each resampled estimate
+        is computed from the CD counts of the resampled D and C, and from the CR counts of
+        the resampled C, normalized by the statistics of the samples of D and C.
+
         Args:
             left (Catalog): The left catalog of galaxy samples (D).
             right (Catalog): The right catalog of galaxy samples (C).
             random (Catalog): The catalog of random samples (R).
+            return_covariance (bool): Whether to also return the covariance of the
+                estimate, from the resampled counts (`doboot`). Defaults to False.
 
         Returns:
-            The statistical estimate of the cross-correlation function, as a numpy array.
+            The statistical estimate of the cross-correlation function, as a numpy array,
+            and its covariance matrix if `return_covariance` is set.
         """
-        num_galaxies = compute_catalog_size(left)
-        num_random = compute_catalog_size(random)
-        cd, cr = self.compute_crosscorrelation_counts(left, right, random)
-        args = self._get_cross_args(num_galaxies, num_random, cd, cr)
+        plan = self.make_plan([left, right, random], resampled_catalogs=[left, right])
+        self._check_resampling(plan, return_covariance)
+        counts = self.make_crosscorrelation_counts(plan, left, right, random)
+        resampled = (
+            self.make_resampled_crosscorrelation_counts(plan, left, right, random)
+            if return_covariance
+            else []
+        )
+        *counts, left_stats, right_stats, random_stats, resampled = plan.compute(
+            *counts, plan.get_stats(left), plan.get_stats(right), plan.get_stats(random), resampled
+        )
+        cd, cr = self._normalize_cross_counts(
+            self._transform_counts(counts), left_stats, right_stats, random_stats
+        )
+        num_random = int(random_stats[0])
+        args = self._get_cross_args(int(left_stats[0]), num_random, cd, cr)
         estimate, _ = self._get_cross_subroutine()(*args)
-        return estimate
+        if not return_covariance:
+            return estimate
+        *resampled_counts, left_sample_stats, right_sample_stats = resampled
+        bcd, bcr = self._transform_counts(resampled_counts, resampled=True)
+        sample_estimates = []
+        for i in range(plan.resampling.num_samples):
+            sample_cd, sample_cr = self._normalize_cross_counts(
+                [bcd[..., i], bcr[..., i]], left_sample_stats[:, i], right_sample_stats[:, i], random_stats
+            )
+            args = self._get_cross_args(int(left_sample_stats[0, i]), num_random, sample_cd, sample_cr)
+            sample_estimates.append(self._get_cross_subroutine()(*args)[0])
+        return estimate, plan.resampling.compute_covariance(np.array(sample_estimates))
 
-    @abstractmethod
     def compute_autocorrelation_counts(
         self, catalog: Catalog, random: Catalog
     ) -> list[np.ndarray, np.ndarray, np.ndarray | int]:
         """Computes the auto-correlation counts (DD, RR, DR). These counts are
         represented as numpy arrays but DR may be 0 if it isn't used (e.g. with
         the natural estimator)."""
-        raise NotImplementedError()
+        plan = self.make_plan([catalog, random])
+        counts = self.make_autocorrelation_counts(plan, catalog, random)
+        return self._transform_counts(plan.compute(*counts))
 
-    @abstractmethod
     def compute_crosscorrelation_counts(
         self, left: Catalog, right: Catalog, random: Catalog
     ) -> list[np.ndarray, np.ndarray]:
         """Computes the cross-correlation counts (CD, CR)."""
+        plan = self.make_plan([left, right, random])
+        counts = self.make_crosscorrelation_counts(plan, left, right, random)
+        return self._transform_counts(plan.compute(*counts))
+
+    def make_plan(
+        self, catalogs: list[Catalog], resampled_catalogs: list[Catalog] | None = None
+    ) -> CountsPlan:
+        """Creates the plan to compute all the count terms of the catalogs in a single graph"""
+        self.plan = CountsPlan(self.correlation, catalogs, self.cache, resampled_catalogs)
+        return self.plan
+
+    def make_resampled_autocorrelation_counts(
+        self, plan: CountsPlan, catalog: Catalog, random: Catalog, counts: list[Delayed | np.ndarray | int]
+    ) -> list[Delayed | np.ndarray | int]:
+        """Plans the resampled DD and DR counts, and the resampled statistics of D. DR is
+        0 if the estimator does not use it (as in its planned `counts`)."""
+        counts_dr = counts[2]
+        resampled_dr = 0 if isinstance(counts_dr, int) else plan.get_resampled_cross_counts(catalog, random)
+        return [plan.get_resampled_auto_counts(catalog), resampled_dr, plan.get_resampled_stats(catalog)]
+
+    def make_resampled_crosscorrelation_counts(
+        self, plan: CountsPlan, left: Catalog, right: Catalog, random: Catalog
+    ) -> list[Delayed | np.ndarray]:
+        """Plans the resampled CD and CR counts, and the resampled statistics of D and C"""
+        return [
+            plan.get_resampled_cross_counts(right, left),
+            plan.get_resampled_cross_counts(right, random),
+            plan.get_resampled_stats(left),
+            plan.get_resampled_stats(right),
+        ]
+
+    @abstractmethod
+    def make_autocorrelation_counts(
+        self, plan: CountsPlan, catalog: Catalog, random: Catalog
+    ) -> list[Delayed | np.ndarray | int]:
+        """Plans the auto-correlation counts (DD, RR, DR). DR may be 0 if it isn't used."""
         raise NotImplementedError()
 
+    @abstractmethod
+    def make_crosscorrelation_counts(
+        self, plan: CountsPlan, left: Catalog, right: Catalog, random: Catalog
+    ) -> list[Delayed | np.ndarray]:
+        """Plans the cross-correlation counts (CD, CR)."""
+        raise NotImplementedError()
+
+    def _transform_counts(
+        self, counts: list[np.ndarray | int], resampled: bool = False
+    ) -> list[np.ndarray | int]:
+        """Applies the correlation transformations to the computed counts, or to the
+        resampled counts, skipping the ones that are not used by the estimator"""
+        if resampled:
+            return [
+                self.correlation.transform_resampled_counts(c) if isinstance(c, np.ndarray) else c
+                for c in counts
+            ]
+        return [self.correlation.transform_counts([c])[0] if isinstance(c, np.ndarray) else c for c in counts]
+
+    @staticmethod
+    def _get_sample(counts: np.ndarray | int, index: int) -> np.ndarray | int:
+        """The counts of a resampled catalog, or 0 if the estimator does not use them"""
+        return counts[..., index] if isinstance(counts, np.ndarray) else counts
+
+    def _normalize_auto_counts(
+        self, counts: list[np.ndarray | int], catalog_stats: np.ndarray, random_stats: np.ndarray
+    ) -> list[np.ndarray | int]:
+        """Rescales the weighted auto-correlation counts (DD, RR, DR) so that the estimator
+        routines, which normalize them by the numbers of pairs of points, normalize them by
+        the sums of the weights of the pairs instead"""
+        if not self.correlation.use_weights:
+            return counts
+        dd, rr, dr = counts
+        return [
+            dd * self._get_auto_weight_ratio(catalog_stats),
+            rr * self._get_auto_weight_ratio(random_stats),
+            dr * self._get_cross_weight_ratio(catalog_stats, random_stats),
+        ]
+
+    def _normalize_cross_counts(
+        self,
+        counts: list[np.ndarray],
+        left_stats: np.ndarray,
+        right_stats: np.ndarray,
+        random_stats: np.ndarray,
+    ) -> list[np.ndarray]:
+        """Rescales the weighted cross-correlation counts (CD, CR) so that they are normalized
+        by the sums of the weights of the pairs"""
+        if not self.correlation.use_weights:
+            return counts
+        cd, cr = counts
+        return [
+            cd * self._get_cross_weight_ratio(left_stats, right_stats),
+            cr * self._get_cross_weight_ratio(random_stats, right_stats),
+        ]
+
+    def _get_auto_weight_ratio(self, stats: np.ndarray) -> float | np.ndarray:
+        """The ratio between the number of distinct pairs of a catalog, N(N-1), and the sum
+        of their weights, (Σw)² - Σw², from the catalog statistics (N, Σw, Σw²). The
+        statistics may have a trailing axis of resampled catalogs."""
+        if not self.correlation.use_weights:
+            return 1.0
+        num_points, weights, squared_weights = stats
+        num_pairs, pair_weights = num_points * (num_points - 1), weights**2 - squared_weights
+        return np.divide(num_pairs, pair_weights, out=np.ones_like(pair_weights), where=pair_weights > 0)
+
+    def _get_cross_weight_ratio(self, stats: np.ndarray, other_stats: np.ndarray) -> float | np.ndarray:
+        """The ratio between the number of pairs of two catalogs, N₁N₂, and the sum of
+        their weights, Σw₁Σw₂, from the catalog statistics (N, Σw, Σw²)"""
+        if not self.correlation.use_weights:
+            return 1.0
+        num_pairs, pair_weights = stats[0] * other_stats[0], stats[1] * other_stats[1]
+        return np.divide(num_pairs, pair_weights, out=np.ones_like(pair_weights), where=pair_weights > 0)
+
+    @staticmethod
+    def _check_resampling(plan: CountsPlan, return_covariance: bool):
+        """Checks that the covariance can be computed, if requested"""
+        if return_covariance and plan.resampling is None:
+            raise ValueError("The covariance requires resampling (set doboot=True in the parameters)")
+
     def _get_auto_subroutine(self) -> Callable:
         """Returns the Fortran routine to calculate the auto-correlation estimate"""
         return tpcf_wrp if isinstance(self.correlation, ProjectedCorrelation) else tpcf
@@ -81,7 +274,8 @@ class Estimator(ABC):
         counts_rr: np.ndarray,
         counts_dr: np.ndarray,
     ) -> list:
-        """Returns the args for the auto-correlation estimator routine"""
+        """Returns the args for the auto-correlation estimator routine. The covariance is
+        computed from the resampled estimates, so no bootstrap counts are passed."""
         counts_bdd = self.correlation.get_bdd_counts()
         args = [num_galaxies, num_random, counts_dd, counts_bdd, counts_rr, counts_dr]
         if isinstance(self.correlation, ProjectedCorrelation):
@@ -101,7 +295,8 @@ class Estimator(ABC):
         counts_cd: np.ndarray,
         counts_cr: np.ndarray,
     ) -> list:
-        """Returns the args for the cross-correlation estimator routine"""
+        """Returns the args for the cross-correlation estimator routine. The covariance is
+        computed from the resampled estimates, so no bootstrap counts are passed."""
         counts_bdd = self.correlation.get_bdd_counts()
         args = [num_galaxies, num_random, counts_cd, counts_bdd, counts_cr]
         if isinstance(self.correlation, ProjectedCorrelation):
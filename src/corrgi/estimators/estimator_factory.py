@@ -1,17 +1,29 @@
+from __future__ import annotations
+
+from corrgi.cache import CountsCache
 from corrgi.correlation.correlation import Correlation
 from corrgi.estimators.davis_peebles_estimator import DavisPeeblesEstimator
 from corrgi.estimators.estimator import Estimator
+from corrgi.estimators.hamilton_estimator import HamiltonEstimator
+from corrgi.estimators.landy_szalay_estimator import LandySzalayEstimator
 from corrgi.estimators.natural_estimator import NaturalEstimator
 
-estimator_class_for_type: dict[str, type[Estimator]] = {"NAT": NaturalEstimator, "DP": DavisPeeblesEstimator}
+estimator_class_for_type: dict[str, type[Estimator]] = {
+    "NAT": NaturalEstimator,
+    "DP": DavisPeeblesEstimator,
+    "LS": LandySzalayEstimator,
+    "HAM": HamiltonEstimator,
+}
 
 
-def get_estimator_for_correlation(correlation: Correlation) -> Estimator:
+def get_estimator_for_correlation(correlation: Correlation, cache: CountsCache | None = None) -> Estimator:
     """Constructs an Estimator instance for the specified correlation.
 
     Args:
         correlation (Correlation): The correlation instance. The type of
             "estimator" to use is specified in its parameters.
+        cache (CountsCache | None): The cache for the counts of the random catalog.
+            Defaults to None, for which the counts are always computed.
 
     Returns:
         An initialized Estimator object wrapping the correlation to compute.
@@ -20,4 +32,4 @@ def get_estimator_for_correlation(correlation: Correlation) -> Estimator:
     if type_to_use not in estimator_class_for_type:
         raise ValueError(f"Cannot load estimator type: {str(type_to_use)}")
     estimator_class = estimator_class_for_type[type_to_use]
-    return estimator_class(correlation)
+    return estimator_class(correlation, cache)
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import numpy as np
+from dask.delayed import Delayed
+from lsdb import Catalog
+
+from corrgi.estimators.estimator import Estimator
+from corrgi.plan import CountsPlan
+
+
+class HamiltonEstimator(Estimator):
+    """Hamilton Estimator"""
+
+    def make_autocorrelation_counts(
+        self, plan: CountsPlan, catalog: Catalog, random: Catalog
+    ) -> list[Delayed | np.ndarray | int]:
+        """Plans the auto-correlation counts for the provided catalog (`DD*RR/DR^2 - 1`).
+
+        The three terms share the partitions of D and R in a single graph.
+
+        Args:
+            plan (CountsPlan): The plan of the counts graph.
+            catalog (Catalog): A galaxy samples catalog (D).
+            random (Catalog): A random samples catalog (R).
+
+        Returns:
+            The DD, RR and DR counts for the Hamilton estimator.
+        """
+        counts_dd = plan.get_auto_counts(catalog)
+        counts_rr = plan.get_auto_counts(random, cached=True)
+        counts_dr = plan.get_cross_counts(catalog, random)
+        return [counts_dd, counts_rr, counts_dr]
+
+    def make_crosscorrelation_counts(
+        self, plan: CountsPlan, left: Catalog, right: Catalog, random: Catalog
+    ) -> list[Delayed | np.ndarray]:
+        """Plans the cross-correlation counts for the provided catalog"""
+        raise NotImplementedError()
@@ -1,37 +1,36 @@
 from __future__ import annotations
 
-import dask
 import numpy as np
+from dask.delayed import Delayed
 from lsdb import Catalog
 
-from corrgi.dask import perform_auto_counts
 from corrgi.estimators.estimator import Estimator
+from corrgi.plan import CountsPlan
 
 
 class NaturalEstimator(Estimator):
     """Natural Estimator"""
 
-    def compute_autocorrelation_counts(
-        self, catalog: Catalog, random: Catalog
-    ) -> list[np.ndarray, np.ndarray, np.ndarray | int]:
-        """Computes the auto-correlation counts for the provided catalog (`DD/RR - 1`).
+    def make_autocorrelation_counts(
+        self, plan: CountsPlan, catalog: Catalog, random: Catalog
+    ) -> list[Delayed | np.ndarray | int]:
+        """Plans the auto-correlation counts for the provided catalog (`DD/RR - 1`).
 
         Args:
+            plan (CountsPlan): The plan of the counts graph.
             catalog (Catalog): A galaxy samples catalog (D).
             random (Catalog): A random samples catalog (R).
 
         Returns:
             The DD, RR and DR counts for the natural estimator.
         """
-        counts_dd = perform_auto_counts(catalog, self.correlation)
-        counts_rr = perform_auto_counts(random, self.correlation)
+        counts_dd = plan.get_auto_counts(catalog)
+        counts_rr = plan.get_auto_counts(random, cached=True)
         counts_dr = 0  # The natural estimator does not use DR counts
-        counts_dd_rr = dask.compute(*[counts_dd, counts_rr])
-        counts_dd_rr = self.correlation.transform_counts(counts_dd_rr)
-        return [*counts_dd_rr, counts_dr]
-
-    def compute_crosscorrelation_counts(
-        self, left: Catalog, right: Catalog, random: Catalog
-    ) -> list[np.ndarray, np.ndarray, np.ndarray]:
-        """Computes the cross-correlation counts for the provided catalog"""
+        return [counts_dd, counts_rr, counts_dr]
+
+    def make_crosscorrelation_counts(
+        self, plan: CountsPlan, left: Catalog, right: Catalog, random: Catalog
+    ) -> list[Delayed | np.ndarray]:
+        """Plans the cross-correlation counts for the provided catalog"""
         raise NotImplementedError()
@@ -1,14 +0,0 @@
-"""An example module containing simplistic methods under benchmarking."""
-
-import random
-import time
-
-
-def runtime_computation():
-    """Runtime computation consuming between 0 and 5 seconds."""
-    time.sleep(random.uniform(0, 5))
-
-
-def memory_computation():
-    """Memory computation for a random list up to 512 samples."""
-    return [0] * random.randint(0, 512)
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import os
+
+import gundam.cflibfor as cff
+import numpy as np
+
+# The gridded Fortran routines log their progress to a file, which we discard
+GRID_LOG_FILE = os.devnull
+
+# The identifier of the counts in the log of the gridded Fortran routines
+GRID_COUNTS_ID = "DD"
+
+# By default each pair of partitions is counted in a single thread, the parallelism comes from Dask
+GRID_NUM_THREADS = 1
+
+# Small margin to avoid issues with points exactly at the edges of the grid
+EDGE_DELTA = 0.001
+
+# Upper limit on the number of cells of a skip table, to bound its memory for small partitions
+MAX_GRID_CELLS = 2**22
+
+
+class SkipGrid:
+    """The skip table (SK) and linked list (LL) used by the gridded gundam routines.
+
+    The grid covers the DEC (and comoving distance) range of the samples being
+    counted, and the full RA circle, as expected by the Fortran routines. Its
+    cells have constant size in DEC, RA and, optionally, comoving distance. The
+    routines only compare the particles of cells that are within the maximum
+    separation of each other.
+
+    Args:
+        sbound (np.ndarray): The boundaries of the grid, in the form (ramin, ramax,
+            decmin, decmax) or (ramin, ramax, decmin, decmax, dcmin, dcmax).
+        mxh1 (int): The number of DEC cells.
+        mxh2 (int): The number of RA cells.
+        mxh3 (int | None): The number of comoving distance cells, for 3D grids.
+    """
+
+    def __init__(self, sbound: np.ndarray, mxh1: int, mxh2: int, mxh3: int | None = None):
+        self.sbound = sbound
+        self.mxh1 = mxh1
+        self.mxh2 = mxh2
+        self.mxh3 = mxh3
+
+    @classmethod
+    def from_angular_samples(cls, ras: list[np.ndarray], decs: list[np.ndarray], dens: float | None = None):
+        """Creates the 2D grid for one or more samples in angular space.
+
+        The size of the grid follows the empirical relations of `gundam.bestSKgrid2d`.
+
+        Args:
+            ras (list[np.ndarray]): The RA of the particles in each sample, in degrees.
+            decs (list[np.ndarray]): The DEC of the particles in each sample, in degrees.
+            dens (float | None): The target number of particles per cell. Defaults to None,
+                for which the gundam defaults are used.
+
+        Returns:
+            The SkipGrid object, without its tables.
+        """
+        npts = sum(len(ra) for ra in ras)
+        dens = dens if dens is not None else (22.0 if npts > 50000 else 16.0)
+        mxh1 = max(int(np.rint(10.75 + 0.075 * np.sqrt(npts))), 1)
+        mxh2 = _get_num_ra_cells(ras, npts / dens / mxh1, mxh1)
+        sbound = [0.0, 360.0, *_get_dec_bounds(decs)]
+        return cls(np.array(sbound), mxh1, mxh2)
+
+    @classmethod
+    def from_spatial_samples(
+        cls,
+        ras: list[np.ndarray],
+        decs: list[np.ndarray],
+        dcs: list[np.ndarray],
+        radial_max: float,
+        kind: str = "rppi",
+        dens: float | None = None,
+    ):
+        """Creates the 3D grid for one or more samples in (RA, DEC, comoving distance) space.
+
+        The size of the grid follows the empirical relations of `gundam.bestSKgrid3d`.
+
+        Args:
+            ras (list[np.ndarray]): The RA of the particles in each sample, in degrees.
+            decs (list[np.ndarray]): The DEC of the particles in each sample, in degrees.
+            dcs (list[np.ndarray]): The comoving distances of the particles in each sample.
+            radial_max (float): The maximum radial separation of the pairs to count.
+            kind (str): The type of counts, "rppi" (projected) or "s" (redshift space).
+            dens (float | None): The target number of particles per cell. Defaults to None,
+                for which the gundam defaults are used.
+
+        Returns:
+            The SkipGrid object, without its tables.
+        """
+        npts = sum(len(ra) for ra in ras)
+        dcmin = max(min(np.min(dc) for dc in dcs) - EDGE_DELTA, 0.0)
+        dcmax = max(np.max(dc) for dc in dcs) + EDGE_DELTA
+        # The radial cells must be at least as large as the maximum radial separation
+        dcmax = max(dcmax, dcmin + radial_max)
+        mxh3 = max(int((dcmax - dcmin) / radial_max), 1)
+        if kind == "rppi":
+            dens = dens if dens is not None else (18.0 if npts > 100000 else 8.0)
+            mxh1 = max(int(np.rint(2.92 + 0.05 * np.sqrt(npts))), 1)
+        else:
+            dens = dens if dens is not None else (28.0 if npts > 100000 else 12.0)
+            mxh1 = max(int(np.rint(4.03 + 0.03 * np.sqrt(npts))), 1)
+        mxh2 = _get_num_ra_cells(ras, npts / (dens * mxh3) / mxh1, mxh1 * mxh3)
+        sbound = [0.0, 360.0, *_get_dec_bounds(decs), dcmin, dcmax]
+        return cls(np.array(sbound), mxh1, mxh2, mxh3)
+
+    def get_sort_index(self, ra: np.ndarray, dec: np.ndarray) -> np.ndarray:
+        """Sort index that places the particles of the same cell close in memory.
+
+        Args:
+            ra (np.ndarray): The RA of the particles, in degrees.
+            dec (np.ndarray): The DEC of the particles, in degrees.
+
+        Returns:
+            The index that sorts the particles by DEC cell, and by RA cell within them.
+        """
+        ramin, ramax, decmin, decmax = self.sbound[:4]
+        cells_ra = ((ra - ramin) / (ramax - ramin) * self.mxh2).astype(np.int64)
+        cells_dec = ((dec - decmin) / (decmax - decmin) * self.mxh1).astype(np.int64)
+        return np.lexsort((cells_ra, cells_dec))
+
+    def make_tables(
+        self, ra: np.ndarray, dec: np.ndarray, dc: np.ndarray | None = None, sepv: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Builds the skip table and linked list for a sample of particles.
+
+        Args:
+            ra (np.ndarray): The RA of the particles, in degrees.
+            dec (np.ndarray): The DEC of the particles, in degrees.
+            dc (np.ndarray | None): The comoving distance of the particles, for 3D grids.
+            sepv (np.ndarray | None): The bins of radial separation, for 3D grids.
+
+        Returns:
+            The skip table (SK) and the linked list (LL).
+        """
+        if self.mxh3 is None:
+            return cff.mod.skll2d(self.mxh1, self.mxh2, len(ra), ra, dec, self.sbound)
+        return cff.mod.skll3d(
+            self.mxh1, self.mxh2, self.mxh3, len(ra), ra, dec, dc, self.sbound, sepv, len(sepv) - 1
+        )
+
+    def get_args(self) -> list:
+        """The grid arguments, in the order expected by the gridded routines"""
+        args = [self.sbound, self.mxh1, self.mxh2]
+        if self.mxh3 is not None:
+            args.append(self.mxh3)
+        return args
+
+
+def _get_num_ra_cells(ras: list[np.ndarray], target_cells: float, num_other_cells: int) -> int:
+    """Gets the number of RA cells over the full circle to reach the target number of cells
+    in the RA range of the samples. Samples that seem to cross RA=0 are measured around it."""
+    ra = np.concatenate(ras)
+    width = np.max(ra) - np.min(ra)
+    if width > 180:
+        shifted_ra = (ra + 180) % 360
+        width = min(width, np.max(shifted_ra) - np.min(shifted_ra))
+    width = max(width, EDGE_DELTA)
+    mxh2 = int(np.rint(target_cells) * (360 / width))
+    return min(max(mxh2, 1), max(MAX_GRID_CELLS // num_other_cells, 1))
+
+
+def _get_dec_bounds(decs: list[np.ndarray]) -> tuple[float, float]:
+    """Gets the DEC range of the grid"""
+    decmin = max(min(np.min(dec) for dec in decs) - EDGE_DELTA, -90.0)
+    decmax = min(max(np.max(dec) for dec in decs) + EDGE_DELTA, 90.0)
+    return decmin, decmax
@@ -15,7 +15,7 @@ def create_gundam_params(kind: str, **kwargs) -> Munch:
         The dictionary of gundam parameters.
     """
     params = gundam.packpars(kind=kind, write=False)
-    # Disable grid and fill its unused parameters
+    # Disable grid by default (set grid=1 to enable it) and fill its unused parameters
     params.grid = 0
     params.autogrid = False
     params.sbound = [1, 2, 1, 2]
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import dask
+import numpy as np
+import pandas as pd
+from dask.delayed import Delayed
+from hipscat.pixel_math import HealpixPixel
+from lsdb import Catalog
+
+from corrgi.cache import CountsCache
+from corrgi.correlation.correlation import Correlation
+from corrgi.dask import (
+    DEFAULT_FAN_IN,
+    compute_partition_stats,
+    join_count_histograms,
+    join_pair_histograms,
+    join_resampled_histograms,
+    make_auto_partials,
+    make_cross_partials,
+    make_task_report,
+    prepare_partitions,
+    prepare_partitions_with_records,
+    share_correlation,
+)
+from corrgi.resampling import Resampling, get_resampling
+
+
+class CountsPlan:
+    """Plans all the count terms of an estimator in a single Dask graph.
+
+    Each catalog is loaded and prepared once, however many terms it takes part
+    in (e.g. D in DD and DR), and each term is only created once. All the terms
+    are then computed together, so the scheduler can interleave them freely.
+    The resampled counts of a term reuse the partial counts of its pairs of
+    partitions, so the errors come from the same pass over the data.
+
+    With the `instrument` parameter, the preparation of the partitions and the counting
+    tasks are timed, and `task_report` holds their records after each computation.
+
+    Args:
+        correlation (Correlation): The correlation instance.
+        catalogs (list[Catalog]): All the catalogs of the estimator.
+        cache (CountsCache | None): The cache for the counts of the terms that
+            support it. Defaults to None.
+        resampled_catalogs (list[Catalog] | None): The data catalogs whose partitions
+            define the resampling regions, if resampling is enabled in the parameters.
+    """
+
+    def __init__(
+        self,
+        correlation: Correlation,
+        catalogs: list[Catalog],
+        cache: CountsCache | None = None,
+        resampled_catalogs: list[Catalog] | None = None,
+    ):
+        self.correlation = correlation
+        self.cache = cache
+        self.correlation.setup(catalogs)
+        self.resampling: Resampling | None = None
+        if resampled_catalogs:
+            self.resampling = get_resampling(correlation.params)
+        if self.resampling is not None:
+            self.resampling.set_regions(
+                [pixel for catalog in resampled_catalogs for pixel in catalog.get_healpix_pixels()]
+            )
+        # The catalogs whose partitions are weighted by their regions in the resampled counts
+        self._resampled_keys = {id(catalog) for catalog in resampled_catalogs or []}
+        self.fan_in = correlation.params.get("fan_in", DEFAULT_FAN_IN)
+        # Keep a reference to the planned catalogs, which are identified by their id
+        self._catalogs: dict[int, Catalog] = {}
+        self._points: dict[int, dict[HealpixPixel, Delayed]] = {}
+        self._partition_stats: dict[int, list[Delayed]] = {}
+        self._stats: dict[tuple, Delayed] = {}
+        self._partials: dict[tuple, tuple[list[list[tuple[HealpixPixel, HealpixPixel]]], list[Delayed]]] = {}
+        self._counts: dict[tuple, Delayed | np.ndarray] = {}
+        # The delayed counts to store in cache once they are computed
+        self._pending_counts: list[tuple[dict, Delayed]] = []
+        # The records of the instrumented tasks, and their report once computed
+        self.instrument = bool(correlation.params.get("instrument", False))
+        self._prepare_records: dict[int, dict[HealpixPixel, Delayed]] = {}
+        self._count_records: dict[tuple, list[Delayed]] = {}
+        self.task_report: pd.DataFrame | None = None
+
+    def get_points(self, catalog: Catalog) -> dict[HealpixPixel, Delayed]:
+        """The prepared partitions of a catalog, shared by all its terms"""
+        key = self._register(catalog)
+        if key not in self._points:
+            if self.instrument:
+                self._points[key], self._prepare_records[key] = prepare_partitions_with_records(
+                    catalog, self.correlation
+                )
+            else:
+                self._points[key] = prepare_partitions(catalog, self.correlation)
+        return self._points[key]
+
+    def get_stats(self, catalog: Catalog) -> Delayed:
+        """The number of points, and sums of weights and squared weights, of a catalog"""
+        key = ("total", self._register(catalog))
+        if key not in self._stats:
+            self._stats[key] = join_count_histograms(self._get_partition_stats(catalog), self.fan_in)
+        return self._stats[key]
+
+    def get_resampled_stats(self, catalog: Catalog) -> Delayed:
+        """The statistics of a catalog in each resampling, with shape (3, samples)"""
+        key = ("resampled", self._register(catalog))
+        if key not in self._stats:
+            pixels = list(self.get_points(catalog))
+            # The statistics of each partition are a stack of a single histogram
+            weights = [self.resampling.get_pixel_weights(pixel)[np.newaxis] for pixel in pixels]
+            partition_stats = [[stats] for stats in self._get_partition_stats(catalog)]
+            self._stats[key] = join_resampled_histograms(partition_stats, weights, self.fan_in)
+        return self._stats[key]
+
+    def get_auto_counts(self, catalog: Catalog, cached: bool = False) -> Delayed | np.ndarray:
+        """The counts of the pairs of a catalog (e.g. DD or RR).
+
+        Args:
+            catalog (Catalog): The catalog.
+            cached (bool): Whether the counts are read from, and stored in, the cache.
+
+        Returns:
+            The delayed counts, or the cached counts if available.
+        """
+        key = ("auto", self._register(catalog))
+        if key not in self._counts:
+            self._counts[key] = self._make_counts([catalog], key, cached)
+        return self._counts[key]
+
+    def get_cross_counts(self, left: Catalog, right: Catalog, cached: bool = False) -> Delayed | np.ndarray:
+        """The counts of the pairs between two catalogs (e.g. DR or CD).
+
+        Args:
+            left (Catalog): The left catalog.
+            right (Catalog): The right catalog.
+            cached (bool): Whether the counts are read from, and stored in, the cache.
+
+        Returns:
+            The delayed counts, or the cached counts if available.
+        """
+        key = ("cross", self._register(left), self._register(right))
+        if key not in self._counts:
+            self._counts[key] = self._make_counts([left, right], key, cached)
+        return self._counts[key]
+
+    def get_resampled_auto_counts(self, catalog: Catalog) -> Delayed:
+        """The counts of the pairs of a catalog in each resampling (e.g. the bootstrap DD)"""
+        return self._make_resampled_counts(("auto", self._register(catalog)))
+
+    def get_resampled_cross_counts(self, left: Catalog, right: Catalog) -> Delayed:
+        """The counts of the pairs between two catalogs in each resampling (e.g. the bootstrap
+        CD, or DR where only the partitions of D are weighted by their regions)"""
+        return self._make_resampled_counts(("cross", self._register(left), self._register(right)))
+
+    def get_task_report(self) -> Delayed:
+        """The report of the instrumented tasks of all the terms planned so far (see
+        `make_task_report`), which is computed along with them"""
+        if not self.instrument:
+            raise ValueError("The tasks are not instrumented (set instrument=True in the parameters)")
+        terms = []
+        for key, records in self._count_records.items():
+            names = [
+                self._catalogs[catalog_key].hc_structure.catalog_info.catalog_name for catalog_key in key[1:]
+            ]
+            term = f"{key[0]}({', '.join(names)})"
+            terms.append((term, records, self._prepare_records[key[1]], self._prepare_records[key[-1]]))
+        return make_task_report(terms)
+
+    def compute(self, *objects) -> list:
+        """Computes the planned objects in a single graph, storing the new counts in cache,
+        and the report of the tasks if they are instrumented"""
+        pending_counts, self._pending_counts = self._pending_counts, []
+        report = [self.get_task_report()] if self.instrument else []
+        results = dask.compute(*objects, *[counts for _, counts in pending_counts], *report)
+        for (description, _), counts in zip(pending_counts, results[len(objects) :]):
+            self.cache.put(description, counts)
+        if self.instrument:
+            self.task_report = results[-1]
+        return list(results[: len(objects)])
+
+    def _make_counts(self, catalogs: list[Catalog], key: tuple, cached: bool) -> Delayed | np.ndarray:
+        """Gets the counts between the catalogs from the cache, if enabled and available,
+        or creates them from their partial counts and stores them in cache once computed."""
+        if not cached or self.cache is None:
+            return self._join_partials(key)
+        description = self.cache.describe_counts(catalogs, self.correlation)
+        if description is None:
+            return self._join_partials(key)
+        counts = self.cache.get(description)
+        if counts is not None:
+            return counts
+        counts = self._join_partials(key)
+        self._pending_counts.append((description, counts))
+        return counts
+
+    def _make_resampled_counts(self, key: tuple) -> Delayed | np.ndarray:
+        """Sums the partial counts of a term, weighted for each resampling"""
+        if self.resampling is None:
+            raise ValueError("Resampling is not enabled (set doboot=True in the parameters)")
+        resampled_key = ("resampled", *key)
+        if resampled_key not in self._counts:
+            pixel_pairs, partials = self._get_partials(key)
+            if len(partials) == 0:
+                counts = self.correlation.make_empty_counts()
+                self._counts[resampled_key] = np.zeros([*counts.shape, self.resampling.num_samples])
+            else:
+                left_key, right_key = key[1], key[-1]
+                left_resampled, right_resampled = (
+                    left_key in self._resampled_keys,
+                    right_key in self._resampled_keys,
+                )
+                weights = [
+                    self.resampling.get_pair_weights(task_pairs, left_resampled, right_resampled)
+                    for task_pairs in pixel_pairs
+                ]
+                self._counts[resampled_key] = join_resampled_histograms(partials, weights, self.fan_in)
+        return self._counts[resampled_key]
+
+    def _join_partials(self, key: tuple) -> Delayed | np.ndarray:
+        """Sums the partial counts of a term"""
+        _, partials = self._get_partials(key)
+        if len(partials) == 0:
+            # No pair of partitions is close enough to hold any pair of objects
+            return self.correlation.make_empty_counts()
+        return join_pair_histograms(partials, self.fan_in)
+
+    def _get_partials(
+        self, key: tuple
+    ) -> tuple[list[list[tuple[HealpixPixel, HealpixPixel]]], list[Delayed]]:
+        """The pairs of partitions counted by each task of a term, and their partial counts"""
+        if key not in self._partials:
+            records = self._count_records.setdefault(key, []) if self.instrument else None
+            if key[0] == "auto":
+                catalog = self._catalogs[key[1]]
+                self._partials[key] = make_auto_partials(
+                    catalog, self.correlation, self.get_points(catalog), records
+                )
+            else:
+                left, right = self._catalogs[key[1]], self._catalogs[key[2]]
+                self._partials[key] = make_cross_partials(
+                    left, right, self.correlation, self.get_points(left), self.get_points(right), records
+                )
+        return self._partials[key]
+
+    def _get_partition_stats(self, catalog: Catalog) -> list[Delayed]:
+        """The statistics of each partition of a catalog"""
+        key = self._register(catalog)
+        if key not in self._partition_stats:
+            shared_correlation = share_correlation(self.correlation)
+            self._partition_stats[key] = [
+                compute_partition_stats(points, shared_correlation)
+                for points in self.get_points(catalog).values()
+            ]
+        return self._partition_stats[key]
+
+    def _register(self, catalog: Catalog) -> int:
+        """Gets the key of a catalog in the plan"""
+        self._catalogs[id(catalog)] = catalog
+        return id(catalog)
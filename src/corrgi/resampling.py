@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+from hipscat.pixel_math import HealpixPixel
+from munch import Munch
+
+
+class Resampling(ABC):
+    """Resampling of the data catalogs in HEALPix regions, to estimate the errors
+    and covariance of the correlation from a single pass over the data.
+
+    Each partition belongs to the region that contains it, so the resampled
+    counts are obtained by weighting the partial counts of each pair of
+    partitions with the weights of their regions in each sample.
+
+    Args:
+        order (int | None): The HEALPix order of the regions. It is limited to the
+            smallest order of the partitions, so that each partition belongs to a
+            single region. Defaults to None, for which that smallest order is used.
+    """
+
+    def __init__(self, order: int | None = None):
+        self.order = order
+        self.regions: list[HealpixPixel] = []
+
+    @property
+    @abstractmethod
+    def num_samples(self) -> int:
+        """The number of resampled catalogs"""
+        raise NotImplementedError()
+
+    def set_regions(self, pixels: list[HealpixPixel]):
+        """Defines the regions from the partitions of the resampled catalogs"""
+        min_order = min(pixel.order for pixel in pixels)
+        self.order = min_order if self.order is None else min(self.order, min_order)
+        self.regions = sorted({self.get_region(pixel) for pixel in pixels})
+        self._region_weights = dict(zip(self.regions, self.make_region_weights(len(self.regions))))
+
+    def get_region(self, pixel: HealpixPixel) -> HealpixPixel:
+        """The region that contains a partition"""
+        return HealpixPixel(self.order, pixel.pixel >> (2 * (pixel.order - self.order)))
+
+    def get_pixel_weights(self, pixel: HealpixPixel) -> np.ndarray:
+        """The weights of a partition in each sample"""
+        return self._region_weights[self.get_region(pixel)]
+
+    def get_pair_weights(
+        self,
+        pixel_pairs: list[tuple[HealpixPixel, HealpixPixel]],
+        left_resampled: bool = True,
+        right_resampled: bool = True,
+    ) -> np.ndarray:
+        """The weights of the counts of pairs of partitions in each sample.
+
+        Only the partitions of the resampled (data) catalogs are weighted by their
+        regions. The partitions of the other catalogs (e.g. the randoms in DR) are
+        kept whole in every sample.
+        """
+        ones = np.ones(self.num_samples)
+        weights = [
+            (self.get_pixel_weights(left_pixel) if left_resampled else ones)
+            * (self.get_pixel_weights(right_pixel) if right_resampled else ones)
+            for left_pixel, right_pixel in pixel_pairs
+        ]
+        return np.array(weights).reshape(len(pixel_pairs), self.num_samples)
+
+    @abstractmethod
+    def make_region_weights(self, num_regions: int) -> np.ndarray:
+        """Generates the weights of the regions, with shape (regions, samples)"""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def compute_covariance(self, estimates: np.ndarray) -> np.ndarray:
+        """Computes the covariance of the estimates, with shape (samples, bins)"""
+        raise NotImplementedError()
+
+
+class Bootstrap(Resampling):
+    """Bootstrap resampling, where each sample draws the regions with replacement.
+
+    Args:
+        num_samples (int): The number of bootstrap samples.
+        seed (int | None): The seed of the random number generator.
+        order (int | None): The HEALPix order of the regions.
+    """
+
+    def __init__(self, num_samples: int, seed: int | None = None, order: int | None = None):
+        super().__init__(order)
+        self._num_samples = num_samples
+        self.seed = seed
+
+    @property
+    def num_samples(self) -> int:
+        """The number of bootstrap samples"""
+        return self._num_samples
+
+    def make_region_weights(self, num_regions: int) -> np.ndarray:
+        """The weight of each region is the number of times it is drawn"""
+        rng = np.random.default_rng(self.seed)
+        probabilities = np.full(num_regions, 1 / num_regions)
+        return rng.multinomial(num_regions, probabilities, size=self.num_samples).T.astype(np.float64)
+
+    def compute_covariance(self, estimates: np.ndarray) -> np.ndarray:
+        """The sample covariance of the bootstrap estimates"""
+        return np.atleast_2d(np.cov(estimates, rowvar=False))
+
+
+class Jackknife(Resampling):
+    """Delete-one jackknife resampling, where each sample leaves out one region.
+
+    Args:
+        order (int | None): The HEALPix order of the regions.
+    """
+
+    @property
+    def num_samples(self) -> int:
+        """There is one sample per region"""
+        return len(self.regions)
+
+    def make_region_weights(self, num_regions: int) -> np.ndarray:
+        """Each sample gives zero weight to one of the regions"""
+        return 1 - np.eye(num_regions)
+
+    def compute_covariance(self, estimates: np.ndarray) -> np.ndarray:
+        """The jackknife covariance, scaled by (N - 1) / N"""
+        num_samples = len(estimates)
+        deviations = estimates - np.mean(estimates, axis=0)
+        return (num_samples - 1) / num_samples * deviations.T @ deviations
+
+
+def get_resampling(params: Munch) -> Resampling | None:
+    """Creates the resampling specified in the gundam parameters.
+
+    Resampling is enabled with `doboot`. The method is set with `resampling`, which
+    is "bootstrap" (the default, with `nbts` samples and seed `bseed`) or "jackknife".
+    The HEALPix order of the regions is set with `resampling_order`.
+
+    Args:
+        params (Munch): The gundam parameters.
+
+    Returns:
+        The resampling instance, or None if resampling is disabled.
+    """
+    if not params.get("doboot", False):
+        return None
+    method = params.get("resampling", "bootstrap")
+    order = params.get("resampling_order")
+    if method == "bootstrap":
+        return Bootstrap(params.nbts, params.get("bseed"), order)
+    if method == "jackknife":
+        return Jackknife(order)
+    raise ValueError(f"Cannot load resampling method: {method}")
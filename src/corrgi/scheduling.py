@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+# The smallest default number of pairs of points compared by each counting task,
+# below which the scheduling overhead of a task outweighs its work
+DEFAULT_MIN_TASK_COST = 10_000_000
+
+# A chunk of the points of a partition, as (index of the chunk, number of chunks)
+Chunk = tuple[int, int]
+
+# A block of the pairs of two partitions, as (index of the pair of partitions, chunk of
+# the left partition, chunk of the right partition). The right chunk is None for the
+# pairs within a chunk of a partition, in the auto-counts of that partition.
+Block = tuple[int, Chunk, "Chunk | None"]
+
+
+def schedule_pair_blocks(
+    pair_sizes: list[tuple[int | None, int | None, bool]], task_cost: float | None = None
+) -> list[list[Block]]:
+    """Groups the counting of pairs of partitions in tasks of roughly uniform cost.
+
+    The cost of a pair of partitions is the number of pairs of points it compares:
+    n_left * n_right, or n * (n - 1) / 2 for the pairs within a partition. The pairs
+    that cost more than the target are split in blocks of chunks of their points,
+    and consecutive blocks that cost less are batched in the same task.
+
+    Args:
+        pair_sizes (list[tuple[int | None, int | None, bool]]): The number of points of
+            the left and right partitions of each pair, and whether the pair is the
+            auto-counts of a single partition. The sizes are None if they are unknown.
+        task_cost (float | None): The target cost of each task. Defaults to the mean
+            cost of the pairs, and at least DEFAULT_MIN_TASK_COST.
+
+    Returns:
+        The blocks of pairs counted by each task, in the order of the pairs.
+    """
+    if any(left_size is None or right_size is None for left_size, right_size, _ in pair_sizes):
+        # Without a cost model each pair of partitions is counted in its own task
+        return [[(index, (0, 1), None if auto else (0, 1))] for index, (_, _, auto) in enumerate(pair_sizes)]
+    costs = [get_pair_cost(left_size, right_size, auto) for left_size, right_size, auto in pair_sizes]
+    target_cost = get_target_cost(costs, task_cost)
+    blocks, block_costs = [], []
+    for index, (left_size, right_size, auto) in enumerate(pair_sizes):
+        for left_chunk, right_chunk, cost in split_pair(left_size, right_size, auto, target_cost):
+            blocks.append((index, left_chunk, right_chunk))
+            block_costs.append(cost)
+    return [[blocks[index] for index in batch] for batch in batch_blocks(block_costs, target_cost)]
+
+
+def order_pairs_by_owner(pair_ranks: list[tuple[int, int]], symmetric: bool) -> tuple[list[int], list[int]]:
+    """Orders the pairs of partitions so that all the pairs that touch a partition are adjacent.
+
+    Each pair is owned by one of its partitions: the first one in the catalog order for the
+    pairs of a single catalog, where (i, j) and (j, i) are the same pair, or the left one
+    otherwise. The pairs are sorted by owner and then by their other partition, so the
+    auto-counts of a partition come right before its pairs with the following partitions.
+    As consecutive blocks are batched in the same task, the tasks mostly depend on the
+    prepared points of their owner and the scheduler runs them on the worker holding them.
+
+    Args:
+        pair_ranks (list[tuple[int, int]]): The positions of the left and right partitions
+            of each pair in their catalogs.
+        symmetric (bool): Whether the pairs are between the partitions of a single catalog.
+
+    Returns:
+        The indices of the pairs in order, and the owner of each of the pairs.
+    """
+    owners = [min(left, right) if symmetric else left for left, right in pair_ranks]
+    others = [max(left, right) if symmetric else right for left, right in pair_ranks]
+    order = sorted(range(len(pair_ranks)), key=lambda index: (owners[index], others[index]))
+    return order, owners
+
+
+def get_pair_cost(left_size: int, right_size: int, auto: bool) -> float:
+    """The number of pairs of points compared when counting a pair of partitions"""
+    return left_size * (left_size - 1) / 2 if auto else left_size * right_size
+
+
+def get_target_cost(costs: list[float], task_cost: float | None = None) -> float:
+    """The target cost of the counting tasks, which is the mean cost of the pairs of
+    partitions (so that there are about as many tasks as pairs) unless it is set"""
+    if task_cost is not None:
+        if task_cost <= 0:
+            raise ValueError("The cost of the counting tasks must be positive")
+        return task_cost
+    mean_cost = np.mean(costs) if len(costs) > 0 else 0
+    return max(float(mean_cost), DEFAULT_MIN_TASK_COST)
+
+
+def split_pair(
+    left_size: int, right_size: int | None, auto: bool, target_cost: float
+) -> list[tuple[Chunk, Chunk | None, float]]:
+    """Splits the counting of a pair of partitions in blocks that cost at most about the target.
+
+    The auto-counts of a partition split in m chunks are the auto-counts of each chunk and
+    the cross-counts of each pair of chunks. For the cross-counts of two partitions, the
+    larger partition is split in chunks that are each counted against the other partition.
+
+    Returns:
+        The left chunk, right chunk and cost of each block.
+    """
+    cost = get_pair_cost(left_size, right_size, auto)
+    if cost <= target_cost:
+        return [((0, 1), None if auto else (0, 1), cost)]
+    if auto:
+        num_chunks = min(math.ceil(left_size / math.sqrt(target_cost)), left_size)
+        chunk_size = left_size / num_chunks
+        blocks = []
+        for index in range(num_chunks):
+            blocks.append(((index, num_chunks), None, get_pair_cost(chunk_size, None, True)))
+            blocks.extend(
+                ((index, num_chunks), (other, num_chunks), chunk_size**2)
+                for other in range(index + 1, num_chunks)
+            )
+        return blocks
+    num_chunks = min(math.ceil(cost / target_cost), max(left_size, right_size))
+    if left_size >= right_size:
+        return [((index, num_chunks), (0, 1), cost / num_chunks) for index in range(num_chunks)]
+    return [((0, 1), (index, num_chunks), cost / num_chunks) for index in range(num_chunks)]
+
+
+def batch_blocks(costs: list[float], target_cost: float) -> list[list[int]]:
+    """Groups consecutive blocks in batches that cost at most the target, unless a
+    single block costs more than it.
+
+    Returns:
+        The indices of the blocks in each batch.
+    """
+    batches, batch, batch_cost = [], [], 0.0
+    for index, cost in enumerate(costs):
+        if len(batch) > 0 and batch_cost + cost > target_cost:
+            batches.append(batch)
+            batch, batch_cost = [], 0.0
+        batch.append(index)
+        batch_cost += cost
+    if len(batch) > 0:
+        batches.append(batch)
+    return batches
+
+
+def get_chunk(points: np.ndarray, chunk: Chunk) -> np.ndarray:
+    """Selects a chunk of the points of a prepared partition"""
+    index, num_chunks = chunk
+    num_points = points.shape[1]
+    return points[:, index * num_points // num_chunks : (index + 1) * num_points // num_chunks]
@@ -1,5 +1,11 @@
+from __future__ import annotations
+
 import numpy as np
 from gundam import gundam
+from hipscat.catalog.partition_info import PartitionInfo
+from hipscat.io import paths
+from hipscat.io.parquet_metadata import read_row_group_fragments, row_group_stat_single_value
+from hipscat.pixel_math import HealpixPixel
 from lsdb import Catalog
 from numpy import deg2rad
 
@@ -32,26 +38,85 @@ def project_bins(angular_bins: np.ndarray) -> np.ndarray:
     return (np.sin(0.5 * angular_bins * deg2rad)) ** 2
 
 
-def join_count_histograms(partial_histograms: list[np.ndarray]) -> np.ndarray:
-    """Stack all partial histograms and sum their counts.
+def compute_column_bounds(catalog: Catalog, column: str) -> dict[HealpixPixel, tuple[float, float]]:
+    """Determine the minimum and maximum values of a column in each partition of a catalog.
+
+    The bounds are read from the parquet statistics of the catalog metadata, so that
+    the pairs of partitions can be pruned before building the graph, without an
+    additional pass over the data.
 
     Args:
-        partial_histograms (list[np.ndarray]): The list of count histograms
-            generated for each pair of partitions.
+        catalog (Catalog): An LSDB catalog.
+        column (str): The name of the numeric column.
 
     Returns:
-        The numpy array with the total counts for the partial histograms.
+        A dictionary mapping each pixel of the catalog to its (min, max) column values.
+
+    Raises:
+        ValueError: If the catalog has no `_metadata` file with the statistics of the column.
     """
-    return np.sum(np.stack(partial_histograms), axis=0)
+    bounds = _read_column_bounds_from_metadata(catalog, column)
+    if bounds is None:
+        raise ValueError(
+            f"The bounds of column {column} could not be read from the _metadata statistics of "
+            f"{catalog.hc_structure.catalog_name}. Save the catalog to disk with lsdb before correlating it."
+        )
+    return bounds
 
 
-def compute_catalog_size(catalog: Catalog) -> int:
-    """Compute the number of rows in a catalog.
+def get_partition_sizes(catalog: Catalog) -> dict[HealpixPixel, int] | None:
+    """Read the number of rows of each partition of a catalog from its `_metadata` file.
 
     Args:
         catalog (Catalog): An LSDB catalog.
 
     Returns:
-        The number of rows in the catalog.
+        A dictionary mapping each pixel of the catalog to its number of rows, or None
+        if the metadata file is not available.
     """
-    return catalog._ddf.shape[0].compute()
+    hc_structure = catalog.hc_structure
+    if not hc_structure.on_disk or hc_structure.catalog_base_dir is None:
+        return None
+    metadata_file = paths.get_parquet_metadata_pointer(hc_structure.catalog_base_dir)
+    sizes = {}
+    try:
+        for row_group in read_row_group_fragments(metadata_file, hc_structure.storage_options):
+            pixel = HealpixPixel(
+                row_group_stat_single_value(row_group, PartitionInfo.METADATA_ORDER_COLUMN_NAME),
+                row_group_stat_single_value(row_group, PartitionInfo.METADATA_PIXEL_COLUMN_NAME),
+            )
+            sizes[pixel] = sizes.get(pixel, 0) + row_group.num_rows
+    except (FileNotFoundError, ValueError):
+        return None
+    pixels = catalog.get_healpix_pixels()
+    if any(pixel not in sizes for pixel in pixels):
+        return None
+    return {pixel: sizes[pixel] for pixel in pixels}
+
+
+def _read_column_bounds_from_metadata(
+    catalog: Catalog, column: str
+) -> dict[HealpixPixel, tuple[float, float]] | None:
+    """Read the per-partition column bounds from the `_metadata` file, if possible"""
+    hc_structure = catalog.hc_structure
+    if not hc_structure.on_disk or hc_structure.catalog_base_dir is None:
+        return None
+    metadata_file = paths.get_parquet_metadata_pointer(hc_structure.catalog_base_dir)
+    bounds = {}
+    try:
+        for row_group in read_row_group_fragments(metadata_file, hc_structure.storage_options):
+            if column not in row_group.statistics:
+                return None
+            pixel = HealpixPixel(
+                row_group_stat_single_value(row_group, PartitionInfo.METADATA_ORDER_COLUMN_NAME),
+                row_group_stat_single_value(row_group, PartitionInfo.METADATA_PIXEL_COLUMN_NAME),
+            )
+            stats = row_group.statistics[column]
+            low, high = bounds.get(pixel, (stats["min"], stats["max"]))
+            bounds[pixel] = (min(low, stats["min"]), max(high, stats["max"]))
+    except (FileNotFoundError, ValueError):
+        return None
+    pixels = catalog.get_healpix_pixels()
+    if any(pixel not in bounds for pixel in pixels):
+        return None
+    return {pixel: bounds[pixel] for pixel in pixels}
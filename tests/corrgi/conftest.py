@@ -41,6 +41,11 @@ def pccf_expected_results(test_data_dir):
     return test_data_dir / "expected_results" / "pccf"
 
 
+@pytest.fixture
+def rcf_expected_results(test_data_dir):
+    return test_data_dir / "expected_results" / "rcf"
+
+
 @pytest.fixture
 def data_catalog_dir(hipscat_catalogs_dir):
     return hipscat_catalogs_dir / "DATA"
@@ -141,6 +146,11 @@ def acf_rr_counts(acf_expected_results):
     return np.load(acf_expected_results / "rr_acf.npy")
 
 
+@pytest.fixture
+def acf_dr_counts(acf_expected_results):
+    return np.load(acf_expected_results / "dr_acf.npy")
+
+
 @pytest.fixture
 def acf_dd_counts_with_weights(acf_expected_results):
     return np.load(acf_expected_results / "dd_acf_weight.npy")
@@ -181,6 +191,26 @@ def pccf_cr_counts_with_weights(pccf_expected_results):
     return np.load(pccf_expected_results / "cr_pccf_weight.npy")
 
 
+@pytest.fixture
+def pccf_with_weights_dp_estimate(pccf_expected_results):
+    return np.load(pccf_expected_results / "w_pccf_weights_dp.npy")
+
+
+@pytest.fixture
+def rcf_dd_counts_with_weights(rcf_expected_results):
+    return np.load(rcf_expected_results / "dd_rcf_weight.npy")
+
+
+@pytest.fixture
+def rcf_rr_counts_with_weights(rcf_expected_results):
+    return np.load(rcf_expected_results / "rr_rcf_weight.npy")
+
+
+@pytest.fixture
+def rcf_with_weights_nat_estimate(rcf_expected_results):
+    return np.load(rcf_expected_results / "w_rcf_weights_nat.npy")
+
+
 @pytest.fixture
 def acf_nat_estimate(acf_expected_results):
     return np.load(acf_expected_results / "w_acf_nat.npy")
@@ -191,11 +221,6 @@ def pcf_nat_estimate(pcf_expected_results):
     return np.load(pcf_expected_results / "w_pcf_nat.npy")
 
 
-@pytest.fixture
-def pccf_with_weights_dp_estimate(pccf_expected_results):
-    return np.load(pccf_expected_results / "w_pccf_weights_dp.npy")
-
-
 @pytest.fixture
 def single_data_partition(data_catalog_dir):
     return pd.read_parquet(data_catalog_dir / "Norder=0" / "Dir=0" / "Npix=1.parquet")
@@ -228,3 +253,16 @@ def pcf_params():
     params.omegal = 0.75  # Omega lambda
     params.h0 = 100  # Hubble constant [km/s/Mpc]
     return params
+
+
+@pytest.fixture
+def rcf_params():
+    params = gundam.packpars(kind="rcf")
+    params.nseps = 20  # Number of bins of 3D separation s
+    params.sepsmin = 0.5  # Minimum s in Mpc/h
+    params.dseps = 0.1  # Bin size of s (in log space)
+    params.logseps = 1  # Logarithmic bins
+    params.omegam = 0.25  # Omega matter
+    params.omegal = 0.75  # Omega lambda
+    params.h0 = 100  # Hubble constant [km/s/Mpc]
+    return params
@@ -1,9 +1,11 @@
 import numpy as np
 import numpy.testing as npt
 import pytest
+from gundam.gundam import tpcf
 
 from corrgi.correlation.angular_correlation import AngularCorrelation
-from corrgi.corrgi import compute_autocorrelation
+from corrgi.corrgi import compute_autocorrelation, read_catalog, select_required_columns
+from corrgi.estimators.estimator_factory import get_estimator_for_correlation
 from corrgi.estimators.natural_estimator import NaturalEstimator
 
 
@@ -52,6 +54,70 @@ def test_acf_natural_counts_with_weights_are_correct(
     npt.assert_allclose(counts_rr, acf_rr_counts_with_weights, rtol=2e-3)
 
 
+def test_acf_natural_counts_with_grid_are_correct(
+    dask_client,
+    acf_gals_weight_catalog,
+    acf_rans_weight_catalog,
+    acf_dd_counts_with_weights,
+    acf_rr_counts_with_weights,
+    acf_params,
+):
+    acf_params.grid = 1
+    estimator = NaturalEstimator(
+        AngularCorrelation(params=acf_params, use_weights=True)
+    )
+    counts_dd, counts_rr, _ = estimator.compute_autocorrelation_counts(
+        acf_gals_weight_catalog, acf_rans_weight_catalog
+    )
+    npt.assert_allclose(counts_dd, acf_dd_counts_with_weights, rtol=1e-3)
+    npt.assert_allclose(counts_rr, acf_rr_counts_with_weights, rtol=2e-3)
+
+
+@pytest.mark.parametrize("estimator_type", ["LS", "HAM", "DP"])
+def test_acf_estimates_with_dr_counts_are_correct(
+    dask_client,
+    data_catalog,
+    rand_catalog,
+    acf_dd_counts,
+    acf_dr_counts,
+    acf_params,
+    estimator_type,
+):
+    acf_params.estimator = estimator_type
+    acf_params.grid = 1
+    estimator = get_estimator_for_correlation(AngularCorrelation(params=acf_params))
+    counts_dd, counts_rr, counts_dr = estimator.compute_autocorrelation_counts(
+        data_catalog, rand_catalog
+    )
+    npt.assert_allclose(counts_dd, acf_dd_counts, rtol=1e-3)
+    npt.assert_allclose(counts_dr, acf_dr_counts, rtol=1e-3)
+    estimate = compute_autocorrelation(
+        data_catalog, rand_catalog, AngularCorrelation, params=acf_params
+    )
+    num_data = data_catalog.hc_structure.catalog_info.total_rows
+    num_random = rand_catalog.hc_structure.catalog_info.total_rows
+    bdd = np.zeros([len(counts_dd), 0])
+    expected, _ = tpcf(
+        num_data, num_random, counts_dd, bdd, counts_rr, counts_dr, estimator_type
+    )
+    npt.assert_allclose(estimate, expected)
+
+
+def test_acf_selects_required_columns(data_catalog, acf_params):
+    correlation = AngularCorrelation(params=acf_params)
+    [catalog] = select_required_columns([data_catalog], correlation)
+    assert list(catalog.columns) == ["ra", "dec"]
+
+
+def test_acf_reads_required_columns(data_catalog_dir, acf_params):
+    correlation = AngularCorrelation(params=acf_params)
+    catalog = read_catalog(data_catalog_dir, correlation)
+    assert list(catalog.columns) == ["ra", "dec"]
+    pixel = catalog.get_healpix_pixels()[0]
+    partition = catalog.get_partition(pixel.order, pixel.pixel).compute()
+    assert list(partition.columns) == ["ra", "dec"]
+
+
 def test_acf_weights_not_provided(data_catalog, rand_catalog, acf_params):
     with pytest.raises(ValueError, match="does not exist"):
         compute_autocorrelation(
@@ -19,3 +19,29 @@ def test_crosscorrelation_alignment(dr7_lrg_catalog_dir, dr7_lrg_rand_catalog_di
     ## 12*21 = 252
     assert len(alignment.pixel_mapping) == 252
     assert len(alignment.pixel_mapping.columns) == 6
+
+
+def test_autocorrelation_alignment_drops_distant_pixels(data_catalog_dir):
+    data_catalog = hipscat.read_from_hipscat(data_catalog_dir)
+    alignment = autocorrelation_alignment(data_catalog, max_separation=3.3)
+    assert len(alignment.pixel_mapping) == 14
+    ## Pixels 2 (north cap) and 5 (equator) are too far apart to hold any pair
+    mapping = alignment.pixel_mapping
+    assert (
+        len(mapping[(mapping["primary_Npix"] == 2) & (mapping["join_Npix"] == 5)]) == 0
+    )
+    ## The largest separation between any two points on the sphere keeps all pairs
+    alignment = autocorrelation_alignment(data_catalog, max_separation=180)
+    assert len(alignment.pixel_mapping) == 21
+
+
+def test_crosscorrelation_alignment_drops_distant_pixels(
+    dr7_lrg_catalog_dir, dr7_lrg_rand_catalog_dir
+):
+    dr7_catalog = hipscat.read_from_hipscat(dr7_lrg_catalog_dir)
+    dr7_rand_catalog = hipscat.read_from_hipscat(dr7_lrg_rand_catalog_dir)
+    alignment = crosscorrelation_alignment(
+        dr7_catalog, dr7_rand_catalog, max_separation=1
+    )
+    assert len(alignment.pixel_mapping) == 125
+    assert len(alignment.pixel_mapping.columns) == 6
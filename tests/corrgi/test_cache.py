@@ -0,0 +1,98 @@
+import numpy as np
+import numpy.testing as npt
+from corrgi.cache import CountsCache
+from corrgi.correlation.angular_correlation import AngularCorrelation
+from corrgi.estimators.natural_estimator import NaturalEstimator
+
+
+def test_counts_cache_stores_counts(tmp_path, rand_catalog, acf_params):
+    cache = CountsCache(tmp_path)
+    description = cache.describe_counts(
+        [rand_catalog], AngularCorrelation(params=acf_params)
+    )
+    assert cache.get(description) is None
+    cache.put(description, np.arange(5.0))
+    npt.assert_array_equal(cache.get(description), np.arange(5.0))
+
+
+def test_counts_cache_depends_on_correlation(tmp_path, rand_catalog, acf_params):
+    cache = CountsCache(tmp_path)
+    description = cache.describe_counts(
+        [rand_catalog], AngularCorrelation(params=acf_params)
+    )
+    weighted = cache.describe_counts(
+        [rand_catalog], AngularCorrelation(params=acf_params, use_weights=True)
+    )
+    acf_params.nsept += 1
+    rebinned = cache.describe_counts(
+        [rand_catalog], AngularCorrelation(params=acf_params)
+    )
+    cache.put(description, np.arange(5.0))
+    assert cache.get(weighted) is None
+    assert cache.get(rebinned) is None
+
+
+def test_counts_cache_skips_filtered_catalogs(tmp_path, rand_catalog, acf_params):
+    cache = CountsCache(tmp_path)
+    filtered_catalog = rand_catalog.cone_search(0, 0, 3600)
+    assert (
+        cache.describe_counts([filtered_catalog], AngularCorrelation(params=acf_params))
+        is None
+    )
+
+
+def test_counts_cache_invalidates_catalog(
+    tmp_path, data_catalog, rand_catalog, acf_params
+):
+    cache = CountsCache(tmp_path)
+    correlation = AngularCorrelation(params=acf_params)
+    data_description = cache.describe_counts([data_catalog], correlation)
+    rand_description = cache.describe_counts([rand_catalog], correlation)
+    cache.put(data_description, np.arange(5.0))
+    cache.put(rand_description, np.arange(5.0))
+    assert cache.invalidate(rand_catalog) == 1
+    assert cache.get(rand_description) is None
+    assert cache.get(data_description) is not None
+    cache.clear()
+    assert cache.get_size() == 0
+
+
+def test_counts_cache_evicts_least_recently_used(tmp_path, rand_catalog, acf_params):
+    cache = CountsCache(tmp_path)
+    descriptions = [{"catalogs": [], "correlation": {"index": i}} for i in range(3)]
+    cache.put(descriptions[0], np.zeros(1000))
+    entry_size = cache.get_size()
+    cache.max_size = 2 * entry_size
+    cache.put(descriptions[1], np.zeros(1000))
+    cache.get(descriptions[0])
+    cache.put(descriptions[2], np.zeros(1000))
+    assert cache.get_size() <= 2 * entry_size
+    assert cache.get(descriptions[0]) is not None
+    assert cache.get(descriptions[1]) is None
+    assert cache.get(descriptions[2]) is not None
+
+
+def test_acf_natural_counts_use_cached_random_counts(
+    dask_client,
+    tmp_path,
+    data_catalog,
+    rand_catalog,
+    acf_dd_counts,
+    acf_rr_counts,
+    acf_params,
+):
+    acf_params.grid = 1
+    cache = CountsCache(tmp_path)
+    estimator = NaturalEstimator(AngularCorrelation(params=acf_params), cache)
+    _, counts_rr, _ = estimator.compute_autocorrelation_counts(
+        data_catalog, rand_catalog
+    )
+    npt.assert_allclose(counts_rr, acf_rr_counts, rtol=2e-3)
+    # The random counts are read from the cache instead of being computed again
+    description = cache.describe_counts([rand_catalog], estimator.correlation)
+    cache.put(description, np.ones_like(counts_rr))
+    counts_dd, counts_rr, _ = estimator.compute_autocorrelation_counts(
+        data_catalog, rand_catalog
+    )
+    npt.assert_allclose(counts_dd, acf_dd_counts, rtol=1e-3)
+    npt.assert_array_equal(counts_rr, np.ones_like(counts_rr))
@@ -0,0 +1,46 @@
+import corrgi.cosmology
+import numpy as np
+import pytest
+from astropy.cosmology import LambdaCDM
+from corrgi.cosmology import ComovingDistanceTable
+
+
+def test_comoving_distance_table_is_within_tolerance():
+    cosmo = LambdaCDM(H0=100, Om0=0.25, Ode0=0.75)
+    table = ComovingDistanceTable(cosmo, 0.01, 0.5, tolerance=1e-8)
+    redshifts = np.random.default_rng(0).uniform(0.01, 0.5, 1000)
+    exact = cosmo.comoving_distance(redshifts).value
+    assert np.all(np.abs(table(redshifts) - exact) <= 1e-8 * exact.max())
+
+
+def test_comoving_distance_table_starts_at_zero_redshift():
+    cosmo = LambdaCDM(H0=100, Om0=0.25, Ode0=0.75)
+    table = ComovingDistanceTable(cosmo, 0.0, 1.0, tolerance=1e-7)
+    assert len(table.redshifts) < 2**12
+    redshifts = np.random.default_rng(0).uniform(0, 1, 1000)
+    exact = cosmo.comoving_distance(redshifts).value
+    assert np.all(np.abs(table(redshifts) - exact) <= table.max_error)
+
+
+def test_comoving_distance_table_warns_at_maximum_size(monkeypatch):
+    monkeypatch.setattr(corrgi.cosmology, "MAX_TABLE_SIZE", 128)
+    cosmo = LambdaCDM(H0=100, Om0=0.25, Ode0=0.75)
+    with pytest.warns(UserWarning, match="maximum size"):
+        table = ComovingDistanceTable(cosmo, 0.0, 1.0, tolerance=1e-12)
+    assert len(table.redshifts) == 129
+    redshifts = np.random.default_rng(0).uniform(0, 1, 1000)
+    exact = cosmo.comoving_distance(redshifts).value
+    assert np.all(np.abs(table(redshifts) - exact) <= 2 * table.max_error)
+
+
+def test_comoving_distance_table_outside_range_is_exact():
+    cosmo = LambdaCDM(H0=100, Om0=0.25, Ode0=0.75)
+    table = ComovingDistanceTable(cosmo, 0.1, 0.2, tolerance=1e-4)
+    redshifts = np.array([0.05, 0.15, 0.3, np.nan])
+    distances = table(redshifts)
+    exact = cosmo.comoving_distance(redshifts).value
+    assert distances[0] == exact[0]
+    assert distances[2] == exact[2]
+    assert np.isnan(distances[3])
+    assert not table.covers(0.05, 0.15)
+    assert table.covers(0.1, 0.2)
@@ -1,6 +1,24 @@
+import math
+
+import dask
 import hipscat
+import numpy as np
+import numpy.testing as npt
+import pytest
+from dask.core import get_dependencies
 
 from corrgi.correlation.angular_correlation import AngularCorrelation
+from corrgi.dask import (
+    TASK_REPORT_COLUMNS,
+    compute_catalog_stats,
+    join_count_histograms,
+    join_pair_histograms,
+    make_auto_partials,
+    make_cross_partials,
+    perform_cross_counts,
+    prepare_partitions,
+)
+from corrgi.plan import CountsPlan
 
 
 def test_count_auto_pairs(
@@ -14,3 +32,193 @@ def test_count_auto_pairs(
         single_data_partition, data_catalog.catalog_info
     )
     assert len(partial) == len(acf_corr_bins) - 1
+
+
+def test_count_auto_pairs_with_grid(
+    single_data_partition,
+    data_catalog_dir,
+    acf_corr_bins,
+    acf_params,
+):
+    data_catalog = hipscat.read_from_hipscat(data_catalog_dir)
+    acf_params.grid = 1
+    partial = AngularCorrelation(acf_params).count_auto_pairs(
+        single_data_partition, data_catalog.catalog_info
+    )
+    assert len(partial) == len(acf_corr_bins) - 1
+
+
+def test_count_pairs_with_grid_threads(
+    single_data_partition, data_catalog_dir, acf_params
+):
+    data_catalog = hipscat.read_from_hipscat(data_catalog_dir)
+    acf_params.grid = 1
+    expected = AngularCorrelation(acf_params).count_auto_pairs(
+        single_data_partition, data_catalog.catalog_info
+    )
+    acf_params.nthreads = 2
+    correlation = AngularCorrelation(acf_params)
+    assert correlation.num_threads == 2
+    partial = correlation.count_auto_pairs(
+        single_data_partition, data_catalog.catalog_info
+    )
+    npt.assert_array_equal(partial, expected)
+    acf_params.nthreads = 0
+    with pytest.raises(ValueError, match="positive"):
+        AngularCorrelation(acf_params).count_auto_pairs(
+            single_data_partition, data_catalog.catalog_info
+        )
+
+
+def test_prepare_partition(single_data_partition, data_catalog_dir, acf_params):
+    data_catalog = hipscat.read_from_hipscat(data_catalog_dir)
+    correlation = AngularCorrelation(acf_params)
+    points = correlation.prepare_partition(
+        single_data_partition, data_catalog.catalog_info
+    )
+    assert points.dtype == np.float64
+    assert points.shape == (
+        len(correlation.get_prepared_columns()),
+        len(single_data_partition),
+    )
+    values = correlation.unpack_partition(points)
+    assert np.array_equal(values.ra, single_data_partition["ra"].to_numpy())
+    assert np.allclose(values.x**2 + values.y**2 + values.z**2, 0.25)
+
+
+def get_reduction_depth(total):
+    graph = dict(total.__dask_graph__())
+    dependencies = {key: get_dependencies(graph, key) for key in graph}
+
+    def get_depth(key):
+        return 1 + max(
+            (get_depth(dependency) for dependency in dependencies[key]), default=-1
+        )
+
+    return get_depth(total.key)
+
+
+def test_join_count_histograms_is_a_tree():
+    rng = np.random.default_rng(42)
+    partials = [rng.uniform(0, 1e6, size=(3, 28)) for _ in range(50)]
+    expected = np.sum(partials, axis=0)
+    for fan_in in [2, 3, 16, 100]:
+        delayed_partials = [dask.delayed(partial) for partial in partials]
+        total = join_count_histograms(delayed_partials, fan_in)
+        assert get_reduction_depth(total) == math.ceil(math.log(50, fan_in))
+        npt.assert_allclose(total.compute(), expected, rtol=1e-12)
+        # The order of the additions is fixed
+        again = join_count_histograms(delayed_partials, fan_in).compute()
+        assert np.array_equal(total.compute(), again)
+
+
+def test_compute_catalog_stats(acf_gals_weight_catalog, acf_params):
+    correlation = AngularCorrelation(acf_params, use_weights=True)
+    points = prepare_partitions(acf_gals_weight_catalog, correlation)
+    stats = compute_catalog_stats(points, correlation).compute()
+    weights = acf_gals_weight_catalog.compute()["wei"].to_numpy()
+    assert stats[0] == len(weights)
+    assert np.isclose(stats[1], np.sum(weights))
+    assert np.isclose(stats[2], np.sum(weights**2))
+
+
+def test_counts_plan_shares_partitions(data_catalog, rand_catalog, acf_params):
+    plan = CountsPlan(AngularCorrelation(acf_params), [data_catalog, rand_catalog])
+    counts_dd = plan.get_auto_counts(data_catalog)
+    counts_dr = plan.get_cross_counts(data_catalog, rand_catalog)
+    assert plan.get_auto_counts(data_catalog) is counts_dd
+    graph = dask.delayed(
+        [counts_dd, counts_dr, plan.get_stats(data_catalog)]
+    ).__dask_graph__()
+    prepared = [key for key in graph if str(key).startswith("prepare_partition")]
+    num_partitions = len(data_catalog.get_healpix_pixels()) + len(
+        rand_catalog.get_healpix_pixels()
+    )
+    assert len(prepared) == num_partitions
+
+
+def test_join_pair_histograms_is_a_tree():
+    rng = np.random.default_rng(42)
+    partials = [
+        rng.uniform(0, 1e6, size=(rng.integers(1, 4), 3, 28)) for _ in range(20)
+    ]
+    expected = np.sum(np.concatenate(partials), axis=0)
+    for fan_in in [2, 3, 16]:
+        delayed_partials = [dask.delayed(partial) for partial in partials]
+        total = join_pair_histograms(delayed_partials, fan_in)
+        assert get_reduction_depth(total) == math.ceil(math.log(20, fan_in))
+        npt.assert_allclose(total.compute(), expected, rtol=1e-12)
+
+
+def test_counts_with_split_and_batched_tasks(
+    monkeypatch, acf_gals_weight_catalog, acf_rans_weight_catalog, acf_params
+):
+    acf_params.grid = 1
+    left, right = acf_gals_weight_catalog, acf_rans_weight_catalog
+    with monkeypatch.context() as patch:
+        # Without the partition sizes each pair of partitions is counted in its own task
+        patch.setattr("corrgi.dask.get_partition_sizes", lambda _: None)
+        correlation = AngularCorrelation(acf_params)
+        pixel_pairs, _ = make_cross_partials(left, right, correlation)
+        assert all(len(task_pairs) == 1 for task_pairs in pixel_pairs)
+        expected = perform_cross_counts(left, right, correlation).compute()
+
+    def count_with_task_cost(task_cost):
+        acf_params.task_cost = task_cost
+        correlation = AngularCorrelation(acf_params)
+        _, partials = make_cross_partials(left, right, correlation)
+        return len(partials), perform_cross_counts(left, right, correlation).compute()
+
+    # The expensive pairs are split in blocks
+    num_tasks, counts = count_with_task_cost(5e6)
+    assert num_tasks > len(pixel_pairs)
+    np.testing.assert_allclose(counts, expected, rtol=1e-10)
+    # The cheap pairs are batched in a single task
+    num_tasks, counts = count_with_task_cost(1e12)
+    assert num_tasks == 1
+    np.testing.assert_allclose(counts, expected, rtol=1e-10)
+
+
+def test_auto_tasks_are_scheduled_by_owner(
+    monkeypatch, acf_gals_weight_catalog, acf_params
+):
+    # Count each pair of partitions in its own task
+    monkeypatch.setattr("corrgi.dask.get_partition_sizes", lambda _: None)
+    correlation = AngularCorrelation(acf_params)
+    points = prepare_partitions(acf_gals_weight_catalog, correlation)
+    pixel_pairs, partials = make_auto_partials(
+        acf_gals_weight_catalog, correlation, points
+    )
+    ranks = {pixel: rank for rank, pixel in enumerate(points)}
+    owners = [min(ranks[left], ranks[right]) for [(left, right)] in pixel_pairs]
+    assert owners == sorted(owners)
+    # The auto-counts of each partition come before its pairs with other partitions
+    for [(left, right)], [previous] in zip(pixel_pairs[1:], pixel_pairs):
+        if left == right:
+            assert min(ranks[pixel] for pixel in previous) < ranks[left]
+    priorities = [
+        partial.__dask_graph__().layers[partial.key].annotations["priority"]
+        for partial in partials
+    ]
+    assert priorities == [-owner for owner in owners]
+
+
+def test_counts_plan_reports_the_tasks(acf_gals_weight_catalog, acf_params):
+    acf_params.instrument = True
+    correlation = AngularCorrelation(acf_params, use_weights=True)
+    plan = CountsPlan(correlation, [acf_gals_weight_catalog])
+    [counts] = plan.compute(plan.get_auto_counts(acf_gals_weight_catalog))
+    report = plan.task_report
+    assert list(report.columns) == TASK_REPORT_COLUMNS
+    assert set(report["term"]) == {"auto(acf_gals_weight)"}
+    pixels = acf_gals_weight_catalog.get_healpix_pixels()
+    assert set(report["left_pixel"]) | set(report["right_pixel"]) == set(pixels)
+    times = report[["left_prepare_time", "right_prepare_time", "count_time"]]
+    assert np.all(times.to_numpy() >= 0)
+    npt.assert_allclose(report["num_pairs"].sum(), np.sum(counts), rtol=1e-10)
+
+
+def test_task_report_requires_instrumentation(acf_gals_weight_catalog, acf_params):
+    plan = CountsPlan(AngularCorrelation(acf_params), [acf_gals_weight_catalog])
+    with pytest.raises(ValueError, match="not instrumented"):
+        plan.get_task_report()
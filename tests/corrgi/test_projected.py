@@ -1,10 +1,20 @@
+import numpy as np
+import dask
+import lsdb
+import pandas as pd
 import pytest
+from corrgi.correlation.correlation import Correlation
 from corrgi.correlation.projected_correlation import ProjectedCorrelation
-from corrgi.corrgi import compute_autocorrelation, compute_crosscorrelation
+from corrgi.corrgi import (
+    compute_autocorrelation,
+    compute_crosscorrelation,
+    select_required_columns,
+)
 import numpy.testing as npt
 
 from corrgi.estimators.natural_estimator import NaturalEstimator
 from corrgi.estimators.davis_peebles_estimator import DavisPeeblesEstimator
+from corrgi.dask import prepare_partitions
 
 
 def test_pcf_natural_counts_are_correct(
@@ -46,6 +56,42 @@ def test_pcf_counts_with_weights_are_correct(
     npt.assert_allclose(counts_rr, pcf_rr_counts_with_weights, rtol=2e-3)
 
 
+def test_pcf_counts_with_grid_are_correct(
+    dask_client,
+    pcf_gals_weight_catalog,
+    pcf_rans_weight_catalog,
+    pcf_dd_counts_with_weights,
+    pcf_rr_counts_with_weights,
+    pcf_params,
+):
+    pcf_params.grid = 1
+    estimator = NaturalEstimator(
+        ProjectedCorrelation(params=pcf_params, use_weights=True)
+    )
+    counts_dd, counts_rr, _ = estimator.compute_autocorrelation_counts(
+        pcf_gals_weight_catalog, pcf_rans_weight_catalog
+    )
+    npt.assert_allclose(counts_dd, pcf_dd_counts_with_weights, rtol=1e-3)
+    npt.assert_allclose(counts_rr, pcf_rr_counts_with_weights, rtol=2e-3)
+
+
+def test_pcf_selects_required_columns(pcf_gals_weight_catalog, pcf_params):
+    correlation = ProjectedCorrelation(params=pcf_params, use_weights=True)
+    [catalog] = select_required_columns([pcf_gals_weight_catalog], correlation)
+    assert list(catalog.columns) == ["ra", "dec", "wei", "z"]
+    assert catalog.get_healpix_pixels() == pcf_gals_weight_catalog.get_healpix_pixels()
+
+
+def test_pcf_interpolates_comoving_distances(pcf_gals_weight_catalog, pcf_params):
+    correlation = ProjectedCorrelation(params=pcf_params, distance_tolerance=1e-8)
+    correlation.setup([pcf_gals_weight_catalog])
+    df = pcf_gals_weight_catalog.compute()
+    redshifts = df["z"].to_numpy(dtype=np.float64)
+    exact = correlation.cosmo.comoving_distance(redshifts).value
+    distances = correlation.calculate_comoving_distances(df)
+    npt.assert_allclose(distances, exact, rtol=0, atol=1e-8 * exact.max())
+
+
 def test_pcf_catalog_has_no_redshift(data_catalog, rand_catalog, pcf_params):
     with pytest.raises(ValueError, match="ph_z not found"):
         compute_autocorrelation(
@@ -74,7 +120,11 @@ def test_pccf_with_weights_davis_peebles_estimate_is_correct(
         params=pcf_params,
         use_weights=True,
     )
-    npt.assert_allclose(estimate, pccf_with_weights_dp_estimate, rtol=1e-2)
+    # With a single LOS bin, the estimate is 2 * pi_max * (CD / CR - 1) in terms of the
+    # normalized counts, so their ratio holds the precision of the counts near w = 0
+    ratio = 1 + estimate / (2 * pcf_params.dsepv)
+    expected = 1 + pccf_with_weights_dp_estimate / (2 * pcf_params.dsepv)
+    npt.assert_allclose(ratio, expected, rtol=1e-3)
 
 
 def test_pccf_counts_with_weights_are_correct(
@@ -94,3 +144,45 @@ def test_pccf_counts_with_weights_are_correct(
     )
     npt.assert_allclose(counts_cd, pccf_cd_counts_with_weights, rtol=1e-3)
     npt.assert_allclose(counts_cr, pccf_cr_counts_with_weights, rtol=2e-3)
+
+
+def test_pcf_radial_slabs_keep_the_counts(pcf_gals_weight_catalog, pcf_params):
+    pcf_params.nsepv = 2
+    pcf_params.dsepv = 5.0
+    correlation = ProjectedCorrelation(params=pcf_params, use_weights=True)
+    correlation.setup([pcf_gals_weight_catalog])
+    catalog_info = pcf_gals_weight_catalog.hc_structure.catalog_info
+    left_pixel, right_pixel = pcf_gals_weight_catalog.get_healpix_pixels()[:2]
+    left_points, right_points = (
+        correlation.prepare_partition(
+            pcf_gals_weight_catalog.get_partition(pixel.order, pixel.pixel).compute(),
+            catalog_info,
+        )[:, :2000]
+        for pixel in (left_pixel, right_pixel)
+    )
+    assert len(correlation.split_radial_slabs(left_points)) > 2
+    npt.assert_allclose(
+        correlation.count_prepared_auto_pairs(left_points),
+        Correlation.count_prepared_auto_pairs(correlation, left_points),
+    )
+    npt.assert_allclose(
+        correlation.count_prepared_cross_pairs(left_points, right_points),
+        Correlation.count_prepared_cross_pairs(correlation, left_points, right_points),
+    )
+
+
+def test_pcf_requires_redshift_statistics(pcf_params):
+    df = pd.DataFrame({"ra": [10.0, 20.0], "dec": [-5.0, 5.0], "z": [0.1, 0.2]})
+    catalog = lsdb.from_dataframe(df, catalog_name="in_memory")
+    with pytest.raises(ValueError, match="_metadata statistics"):
+        ProjectedCorrelation(params=pcf_params).setup([catalog])
+
+
+def test_pcf_distance_table_is_shared_by_the_tasks(pcf_gals_weight_catalog, pcf_params):
+    correlation = ProjectedCorrelation(params=pcf_params)
+    correlation.setup([pcf_gals_weight_catalog])
+    points = prepare_partitions(pcf_gals_weight_catalog, correlation)
+    graph = dask.delayed(list(points.values())).__dask_graph__()
+    shared = [key for key in graph if str(key).startswith("ProjectedCorrelation")]
+    assert len(shared) == 1
+    assert graph[shared[0]].distance_table is correlation.distance_table
@@ -0,0 +1,51 @@
+import numpy.testing as npt
+from corrgi.correlation.redshift_correlation import RedshiftCorrelation
+from corrgi.corrgi import compute_autocorrelation
+from corrgi.estimators.natural_estimator import NaturalEstimator
+from hipscat.pixel_math import HealpixPixel
+
+
+def test_rcf_counts_with_weights_are_correct(
+    dask_client,
+    pcf_gals_weight_catalog,
+    pcf_rans_weight_catalog,
+    rcf_dd_counts_with_weights,
+    rcf_rr_counts_with_weights,
+    rcf_params,
+):
+    estimator = NaturalEstimator(
+        RedshiftCorrelation(params=rcf_params, use_weights=True)
+    )
+    counts_dd, counts_rr, _ = estimator.compute_autocorrelation_counts(
+        pcf_gals_weight_catalog, pcf_rans_weight_catalog
+    )
+    npt.assert_allclose(counts_dd, rcf_dd_counts_with_weights, rtol=2e-3)
+    npt.assert_allclose(counts_rr, rcf_rr_counts_with_weights, rtol=2e-3)
+
+
+def test_rcf_with_weights_natural_estimate_is_correct(
+    dask_client,
+    pcf_gals_weight_catalog,
+    pcf_rans_weight_catalog,
+    rcf_with_weights_nat_estimate,
+    rcf_params,
+):
+    rcf_params.estimator = "NAT"
+    estimate = compute_autocorrelation(
+        pcf_gals_weight_catalog,
+        pcf_rans_weight_catalog,
+        RedshiftCorrelation,
+        params=rcf_params,
+        use_weights=True,
+    )
+    npt.assert_allclose(estimate, rcf_with_weights_nat_estimate, rtol=5e-3)
+
+
+def test_rcf_prunes_radially_distant_partitions(monkeypatch, rcf_params):
+    correlation = RedshiftCorrelation(params=rcf_params)
+    near, overlapping, far = HealpixPixel(0, 0), HealpixPixel(0, 1), HealpixPixel(0, 2)
+    bounds = {near: (0.02, 0.03), overlapping: (0.025, 0.04), far: (0.06, 0.07)}
+    monkeypatch.setattr(correlation, "get_redshift_bounds", lambda _: bounds)
+    pixel_pairs = [(near, near), (near, overlapping), (near, far), (far, near)]
+    pruned = correlation.prune_pixel_pairs(None, None, pixel_pairs)
+    assert pruned == [(near, near), (near, overlapping)]
@@ -0,0 +1,196 @@
+import lsdb
+import numpy as np
+import numpy.testing as npt
+import pytest
+from corrgi.correlation.angular_correlation import AngularCorrelation
+from corrgi.corrgi import compute_autocorrelation, compute_crosscorrelation
+from corrgi.plan import CountsPlan
+from corrgi.resampling import Bootstrap, Jackknife, get_resampling
+from hipscat.pixel_math import HealpixPixel
+
+
+def test_resampling_regions_contain_partitions():
+    resampling = Jackknife()
+    resampling.set_regions(
+        [HealpixPixel(1, 4), HealpixPixel(1, 7), HealpixPixel(2, 33)]
+    )
+    assert resampling.order == 1
+    assert resampling.regions == [
+        HealpixPixel(1, 4),
+        HealpixPixel(1, 7),
+        HealpixPixel(1, 8),
+    ]
+    npt.assert_array_equal(resampling.get_pixel_weights(HealpixPixel(2, 33)), [1, 1, 0])
+
+
+def test_bootstrap_draws_regions_with_replacement():
+    resampling = Bootstrap(num_samples=10, seed=42)
+    resampling.set_regions([HealpixPixel(0, pixel) for pixel in range(5)])
+    weights = np.array(
+        [resampling.get_pixel_weights(region) for region in resampling.regions]
+    )
+    assert weights.shape == (5, 10)
+    npt.assert_array_equal(np.sum(weights, axis=0), 5)
+
+
+def test_jackknife_covariance():
+    estimates = np.array([[1.0, 2.0], [2.0, 3.0], [3.0, 7.0]])
+    covariance = Jackknife().compute_covariance(estimates)
+    deviations = estimates - np.mean(estimates, axis=0)
+    npt.assert_allclose(covariance, 2 / 3 * deviations.T @ deviations)
+
+
+def test_get_resampling(acf_params):
+    assert get_resampling(acf_params) is None
+    acf_params.doboot = True
+    assert isinstance(get_resampling(acf_params), Bootstrap)
+    acf_params.resampling = "jackknife"
+    assert isinstance(get_resampling(acf_params), Jackknife)
+    acf_params.resampling = "unknown"
+    with pytest.raises(ValueError, match="Cannot load"):
+        get_resampling(acf_params)
+
+
+def test_jackknife_counts_leave_out_regions(dask_client, data_catalog, acf_params):
+    acf_params.grid = 1
+    acf_params.doboot = True
+    acf_params.resampling = "jackknife"
+    correlation = AngularCorrelation(acf_params)
+    plan = CountsPlan(correlation, [data_catalog], resampled_catalogs=[data_catalog])
+    counts, resampled_counts = plan.compute(
+        plan.get_auto_counts(data_catalog), plan.get_resampled_auto_counts(data_catalog)
+    )
+    assert resampled_counts.shape == (
+        *counts.shape,
+        len(data_catalog.get_healpix_pixels()),
+    )
+    pixels = data_catalog.get_healpix_pixels()
+    subset = data_catalog.pixel_search(pixels[1:])
+    subset_plan = CountsPlan(correlation, [subset])
+    [subset_counts] = subset_plan.compute(subset_plan.get_auto_counts(subset))
+    npt.assert_allclose(resampled_counts[:, 0], subset_counts)
+
+
+def test_jackknife_stats_leave_out_regions(acf_gals_weight_catalog, acf_params):
+    acf_params.doboot = True
+    acf_params.resampling = "jackknife"
+    correlation = AngularCorrelation(acf_params, use_weights=True)
+    catalog = acf_gals_weight_catalog
+    plan = CountsPlan(correlation, [catalog], resampled_catalogs=[catalog])
+    [resampled_stats] = plan.compute(plan.get_resampled_stats(catalog))
+    assert resampled_stats.shape == (3, len(catalog.get_healpix_pixels()))
+    subset = catalog.pixel_search(catalog.get_healpix_pixels()[1:])
+    weights = subset.compute()["wei"].to_numpy()
+    expected = [len(weights), np.sum(weights), np.sum(weights**2)]
+    npt.assert_allclose(resampled_stats[:, 0], expected)
+
+
+def test_acf_natural_estimate_with_covariance(
+    dask_client, data_catalog, rand_catalog, acf_params
+):
+    acf_params.estimator = "NAT"
+    acf_params.grid = 1
+    acf_params.doboot = True
+    acf_params.nbts = 10
+    estimate, covariance = compute_autocorrelation(
+        data_catalog,
+        rand_catalog,
+        AngularCorrelation,
+        params=acf_params,
+        return_covariance=True,
+    )
+    assert covariance.shape == (len(estimate), len(estimate))
+    npt.assert_allclose(covariance, covariance.T)
+    assert np.all(np.diag(covariance) >= 0)
+
+
+def test_dp_jackknife_covariance_leaves_out_regions(
+    acf_gals_weight_catalog, acf_rans_weight_catalog, acf_params
+):
+    acf_params.estimator = "DP"
+    acf_params.grid = 1
+    acf_params.doboot = True
+    acf_params.resampling = "jackknife"
+    _, covariance = compute_autocorrelation(
+        acf_gals_weight_catalog,
+        acf_rans_weight_catalog,
+        AngularCorrelation,
+        params=acf_params,
+        use_weights=True,
+        return_covariance=True,
+    )
+    # Brute force: the estimate without each region of the data catalog
+    params = acf_params.copy()
+    params.doboot = False
+    pixels = acf_gals_weight_catalog.get_healpix_pixels()
+    estimates = []
+    for left_out in pixels:
+        subset = acf_gals_weight_catalog.pixel_search(
+            [pixel for pixel in pixels if pixel != left_out]
+        )
+        estimates.append(
+            compute_autocorrelation(
+                subset,
+                acf_rans_weight_catalog,
+                AngularCorrelation,
+                params=params,
+                use_weights=True,
+            )
+        )
+    expected = Jackknife().compute_covariance(np.array(estimates))
+    npt.assert_allclose(covariance, expected, rtol=1e-6, atol=1e-12)
+
+
+def test_dp_cross_jackknife_covariance_leaves_out_regions(
+    hipscat_catalogs_dir, acf_gals_weight_catalog, acf_rans_weight_catalog, acf_params
+):
+    acf_params.estimator = "DP"
+    acf_params.grid = 1
+    acf_params.doboot = True
+    acf_params.resampling = "jackknife"
+    right = lsdb.read_hipscat(hipscat_catalogs_dir / "acf_gals_weight")
+    right = right.pixel_search(right.get_healpix_pixels()[1:])
+    _, covariance = compute_crosscorrelation(
+        acf_gals_weight_catalog,
+        right,
+        acf_rans_weight_catalog,
+        AngularCorrelation,
+        params=acf_params,
+        use_weights=True,
+        return_covariance=True,
+    )
+    # Brute force: the estimate without each region of both galaxy catalogs
+    params = acf_params.copy()
+    params.doboot = False
+    pixels = acf_gals_weight_catalog.get_healpix_pixels()
+    estimates = []
+    for left_out in pixels:
+        left_subset, right_subset = [
+            catalog.pixel_search(
+                [pixel for pixel in catalog.get_healpix_pixels() if pixel != left_out]
+            )
+            for catalog in [acf_gals_weight_catalog, right]
+        ]
+        estimates.append(
+            compute_crosscorrelation(
+                left_subset,
+                right_subset,
+                acf_rans_weight_catalog,
+                AngularCorrelation,
+                params=params,
+                use_weights=True,
+            )
+        )
+    expected = Jackknife().compute_covariance(np.array(estimates))
+    npt.assert_allclose(covariance, expected, rtol=1e-6, atol=1e-12)
+
+
+def test_covariance_requires_resampling(data_catalog, rand_catalog, acf_params):
+    with pytest.raises(ValueError, match="doboot"):
+        compute_autocorrelation(
+            data_catalog,
+            rand_catalog,
+            AngularCorrelation,
+            params=acf_params,
+            return_covariance=True,
+        )
@@ -0,0 +1,94 @@
+import numpy as np
+import numpy.testing as npt
+import pytest
+from corrgi.scheduling import (
+    batch_blocks,
+    get_chunk,
+    get_pair_cost,
+    order_pairs_by_owner,
+    schedule_pair_blocks,
+    split_pair,
+)
+
+
+def test_expensive_cross_pairs_are_split_along_the_larger_partition():
+    blocks = split_pair(100, 1000, False, target_cost=30_000)
+    assert len(blocks) == 4
+    assert [(left_chunk, right_chunk) for left_chunk, right_chunk, _ in blocks] == [
+        ((0, 1), (index, 4)) for index in range(4)
+    ]
+    npt.assert_allclose(sum(cost for _, _, cost in blocks), 100 * 1000)
+
+
+def test_expensive_auto_pairs_are_split_in_chunks():
+    blocks = split_pair(1000, 1000, True, target_cost=100_000)
+    chunks = [(left_chunk, right_chunk) for left_chunk, right_chunk, _ in blocks]
+    assert ((0, 4), None) in chunks and ((3, 4), None) in chunks
+    assert ((0, 4), (3, 4)) in chunks and ((3, 4), (0, 4)) not in chunks
+    assert len(blocks) == 4 + 6
+    assert all(cost <= 100_000 for _, _, cost in blocks)
+
+
+def test_cheap_blocks_are_batched():
+    assert batch_blocks([5, 5, 5, 20, 1, 1], target_cost=10) == [
+        [0, 1],
+        [2],
+        [3],
+        [4, 5],
+    ]
+
+
+def test_task_costs_are_uniform():
+    sizes = [
+        (20_000, 20_000, True),
+        (20_000, 500, False),
+        (50, 60, False),
+        (10, 10, True),
+        (5_000, 3, False),
+    ]
+    tasks = schedule_pair_blocks(sizes, task_cost=5_000_000)
+    for task in tasks:
+        task_cost = 0
+        for index, left_chunk, right_chunk in task:
+            left_size, right_size, _ = sizes[index]
+            left_size /= left_chunk[1]
+            right_size = (
+                left_size if right_chunk is None else right_size / right_chunk[1]
+            )
+            task_cost += get_pair_cost(left_size, right_size, right_chunk is None)
+        assert task_cost <= 5_000_000
+    # All the pairs of points are counted
+    assert {index for task in tasks for index, _, _ in task} == set(range(len(sizes)))
+
+
+def test_pairs_without_sizes_are_not_scheduled():
+    tasks = schedule_pair_blocks([(None, None, False), (None, None, True)])
+    assert tasks == [[(0, (0, 1), (0, 1))], [(1, (0, 1), None)]]
+
+
+def test_task_cost_must_be_positive():
+    with pytest.raises(ValueError, match="positive"):
+        schedule_pair_blocks([(10, 10, False)], task_cost=0)
+
+
+def test_chunks_cover_the_points():
+    points = np.arange(20).reshape(2, 10)
+    chunks = [get_chunk(points, (index, 3)) for index in range(3)]
+    npt.assert_array_equal(np.hstack(chunks), points)
+
+
+def test_pairs_are_grouped_by_owner():
+    pair_ranks = [(0, 2), (1, 2), (0, 1), (0, 0), (1, 1), (2, 2)]
+    order, owners = order_pairs_by_owner(pair_ranks, symmetric=True)
+    assert [pair_ranks[index] for index in order] == [
+        (0, 0),
+        (0, 1),
+        (0, 2),
+        (1, 1),
+        (1, 2),
+        (2, 2),
+    ]
+    assert owners == [0, 1, 0, 0, 1, 2]
+    # Between two catalogs the pairs are owned by their left partition
+    _, owners = order_pairs_by_owner([(2, 0), (0, 1)], symmetric=False)
+    assert owners == [2, 0]